@@ -0,0 +1,145 @@
+import asyncio
+import os
+import random
+import aiohttp
+import pandas as pd
+from dataFetcher import HEADERS, RETRIES, is_valid_pricecharting_url, parse_with_cache, build_card_result
+from rateLimiter import wait_for_slot_async, record_response, record_request_error, release_probe
+from linkHealth import NEGATIVE_STATUSES, SKIPPED_LINK, is_link_blocked, record_link_failure, record_link_success
+from responseCache import ResponseCache, get_response_cache
+from dataSanitizer import canonicalize_link
+from utils import log
+import metrics
+import time
+
+# Concurrency limits for the asyncio fetch mode
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "50"))
+ASYNC_PER_HOST_LIMIT = int(os.getenv("ASYNC_PER_HOST_LIMIT", "10"))
+
+REQUEST_TIMEOUT = 10
+
+async def get_card_details_async(session, url):
+    """Async counterpart of dataFetcher.get_card_details using a shared keep-alive session."""
+    url = canonicalize_link(url)
+    if not is_valid_pricecharting_url(url):
+        log(f"Invalid URL: {url}")
+        return None, None, None
+    if is_link_blocked(url):
+        return SKIPPED_LINK, None, None
+
+    loop = asyncio.get_running_loop()
+    cache = get_response_cache()
+    cached = cache.lookup(url) if cache else None
+
+    for attempt in range(RETRIES):
+        if attempt:
+            metrics.inc("retries")
+        probe = False
+        try:
+            with metrics.timer("rate_limit_wait"):
+                probe = await wait_for_slot_async(url)
+
+            metrics.inc("requests")
+            request_start = time.perf_counter()
+            async with session.get(url, headers={**HEADERS, **ResponseCache.validator_headers(cached)}) as response:
+                headers_received = time.perf_counter()
+                status = response.status
+                response_headers = response.headers
+                html = await response.text() if status == 200 else None
+            metrics.observe("ttfb", headers_received - request_start)
+            metrics.observe("download", time.perf_counter() - headers_received)
+
+            record_response(url, status, response_headers.get("Retry-After"))
+            if status == 429:
+                metrics.inc("rate_limited")
+                log(f"Rate limited. Retrying ({attempt+1}/{RETRIES})...")
+                continue
+            if status == 304 and cached:
+                record_link_success(url)
+                return cache.mark_unchanged(url, cached, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+            if status != 200:
+                if status in NEGATIVE_STATUSES:
+                    record_link_failure(url, status, f"HTTP {status}")
+                return None, None, None
+
+            # Parse off the event loop so downloads keep flowing while we parse
+            return await loop.run_in_executor(None, parse_with_cache, cache, cached, url, html, response_headers)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.inc("request_errors")
+            record_request_error(url)
+            log(f"Request error: {e}")
+            await asyncio.sleep(random.uniform(1, 3))
+        finally:
+            if probe:
+                release_probe(url)
+
+    return None, None, None
+
+async def _fetch_one(session, link, index):
+    """Fetches a single link and returns the same tuple as dataFetcher.fetch_card_data."""
+    if pd.notna(link):
+        card_title, card_set, price = await get_card_details_async(session, link)
+        return build_card_result(index, card_title, card_set, price)
+
+    return index, "Title not found", "Set not found", None
+
+def _metrics_trace_config():
+    """aiohttp tracing hooks that record DNS and connect times (only installed when metrics are on)."""
+    trace_config = aiohttp.TraceConfig()
+
+    async def dns_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def dns_end(session, ctx, params):
+        metrics.observe("dns", time.perf_counter() - ctx.dns_start)
+
+    async def connect_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def connect_end(session, ctx, params):
+        metrics.observe("connect", time.perf_counter() - ctx.connect_start)
+
+    trace_config.on_dns_resolvehost_start.append(dns_start)
+    trace_config.on_dns_resolvehost_end.append(dns_end)
+    trace_config.on_connection_create_start.append(connect_start)
+    trace_config.on_connection_create_end.append(connect_end)
+    return trace_config
+
+async def _fetch_all(links, indices, on_result, max_concurrency, per_host_limit):
+    # One pooled connector: the total limit caps requests in flight, the per-host limit protects PriceCharting
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host_limit)
+    # Per-socket timeouts only: a total timeout would also count time spent queued for a pooled connection
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT)
+    trace_configs = [_metrics_trace_config()] if metrics.METRICS_ENABLED else []
+    results = []
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=trace_configs) as session:
+        tasks = [asyncio.ensure_future(_fetch_one(session, link, idx)) for idx, link in zip(indices, links)]
+
+        for task in asyncio.as_completed(tasks):
+            try:
+                result = await task
+            except Exception as e:
+                log(f"Error processing card data: {e}")
+                continue
+
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+    return results
+
+def fetch_all_card_data(links, on_result=None, max_concurrency=None, per_host_limit=None, indices=None):
+    """
+    Fetches every link concurrently on one event loop and returns (index, title, set, price) tuples.
+    on_result, if given, is called with each tuple as soon as it completes.
+    indices defaults to each link's position in links.
+    """
+    return asyncio.run(_fetch_all(
+        links,
+        indices if indices is not None else range(len(links)),
+        on_result,
+        max_concurrency or ASYNC_MAX_CONCURRENCY,
+        per_host_limit or ASYNC_PER_HOST_LIMIT,
+    ))
@@ -0,0 +1,166 @@
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import zipfile
+from datetime import datetime
+from utils import log
+import metrics
+
+# Snapshots live in <workbook name>_backups/ next to the workbook unless BACKUP_DIR is set
+BACKUP_DIR = os.getenv("BACKUP_DIR", "")
+
+# Retention: always keep the newest BACKUP_KEEP_LAST snapshots, plus the newest one of each of the
+# last BACKUP_KEEP_DAILY days and BACKUP_KEEP_WEEKLY ISO weeks that have a snapshot
+BACKUP_KEEP_LAST = int(os.getenv("BACKUP_KEEP_LAST", "5"))
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))
+BACKUP_KEEP_WEEKLY = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))
+
+CHUNK_SIZE = 1024 * 1024
+
+# Workbook parts rewritten with fresh timestamps on every save, even when no cell changed
+VOLATILE_PARTS = ("docProps/core.xml", "docProps/app.xml")
+
+def backup_dir_for(file_path):
+    """Directory holding the backup store for a workbook."""
+    return BACKUP_DIR or f"{os.path.splitext(file_path)[0]}_backups"
+
+def content_hash(file_path):
+    """
+    Hashes a workbook's contents, skipping the parts that only record save times, so re-saving
+    identical data gives the same hash. Files that aren't zip-based workbooks are hashed as raw bytes.
+    """
+    digest = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                if info.filename in VOLATILE_PARTS:
+                    continue
+                digest.update(f"{info.filename}\0{info.file_size}\0".encode("utf-8"))
+                with archive.open(info) as part:
+                    for chunk in iter(lambda: part.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+        return digest.hexdigest()
+    except zipfile.BadZipFile:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+class BackupStore:
+    """
+    Content-addressed workbook backups: each distinct workbook is stored once, gzip-compressed, as
+    objects/<hash>.gz, and manifest.json lists the snapshots (newest last) that point at them.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def snapshots(self):
+        """Returns the manifest's snapshot entries, oldest first."""
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)["snapshots"]
+
+    def _save_manifest(self, snapshots):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"snapshots": snapshots}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, f"{digest}.gz")
+
+    def snapshot(self, file_path):
+        """
+        Backs up file_path unless it matches the newest snapshot. An unchanged size and mtime skips even
+        the hash; content already stored under an older snapshot is referenced rather than copied.
+        Returns the newest snapshot entry.
+        """
+        stat = os.stat(file_path)
+        snapshots = self.snapshots()
+        latest = snapshots[-1] if snapshots else None
+        if latest and latest["size"] == stat.st_size and latest["mtime_ns"] == stat.st_mtime_ns:
+            log("Backup skipped: workbook untouched since the last snapshot.")
+            return latest
+
+        digest = content_hash(file_path)
+        if latest and latest["hash"] == digest:
+            # Re-saved with the same contents; remember the new stat so the next check is free
+            latest.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            self._save_manifest(snapshots)
+            log("Backup skipped: workbook contents unchanged since the last snapshot.")
+            return latest
+
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            tmp_path = f"{object_path}.tmp"
+            with open(file_path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp_path, object_path)
+
+        entry = {
+            "hash": digest,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "stored_bytes": os.path.getsize(object_path),
+        }
+        snapshots.append(entry)
+        self._save_manifest(snapshots)
+        log(f"Backup created: {object_path} ({entry['stored_bytes']} of {entry['size']} bytes)")
+        return entry
+
+    def prune(self, keep_last=None, keep_daily=None, keep_weekly=None):
+        """Applies the retention policy, then deletes objects no remaining snapshot refers to."""
+        keep_last = BACKUP_KEEP_LAST if keep_last is None else keep_last
+        keep_daily = BACKUP_KEEP_DAILY if keep_daily is None else keep_daily
+        keep_weekly = BACKUP_KEEP_WEEKLY if keep_weekly is None else keep_weekly
+
+        snapshots = self.snapshots()
+        keep = set(range(max(0, len(snapshots) - keep_last), len(snapshots)))
+        days, weeks = [], []
+        for i in range(len(snapshots) - 1, -1, -1):  # Newest first, so each period keeps its latest snapshot
+            created = datetime.fromisoformat(snapshots[i]["created_at"])
+            day, week = created.date(), created.isocalendar()[:2]
+            if day not in days and len(days) < keep_daily:
+                days.append(day)
+                keep.add(i)
+            if week not in weeks and len(weeks) < keep_weekly:
+                weeks.append(week)
+                keep.add(i)
+
+        if len(keep) == len(snapshots):
+            return 0
+        remaining = [snapshot for i, snapshot in enumerate(snapshots) if i in keep]
+        self._save_manifest(remaining)
+
+        referenced = {snapshot["hash"] for snapshot in remaining}
+        for name in os.listdir(self.objects_dir):
+            if name.endswith(".gz") and name[:-3] not in referenced:
+                os.remove(os.path.join(self.objects_dir, name))
+        removed = len(snapshots) - len(remaining)
+        log(f"Pruned {removed} old backup snapshots.")
+        return removed
+
+    def restore(self, dest_path, index=-1):
+        """Writes the snapshot at index (newest by default) back out as a workbook at dest_path."""
+        snapshot = self.snapshots()[index]
+        with gzip.open(self._object_path(snapshot["hash"]), "rb") as src, open(dest_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        log(f"Restored backup from {snapshot['created_at']} to {dest_path}")
+        return dest_path
+
+def backup_workbook(file_path):
+    """Snapshots the workbook into its backup store and applies the retention policy."""
+    with metrics.timer("backup"):
+        store = BackupStore(backup_dir_for(file_path))
+        entry = store.snapshot(file_path)
+        store.prune()
+    return entry
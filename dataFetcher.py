@@ -1,66 +1,190 @@
+import os
 import requests
 import time
 import random
-from bs4 import BeautifulSoup
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
 from urllib.parse import urlparse
 from utils import log
+import metrics
+from dataSanitizer import canonicalize_link, parse_price
+from htmlExtractor import extract_card_details
+from rateLimiter import wait_for_slot, record_response, record_request_error, release_probe
+from linkHealth import NEGATIVE_STATUSES, SKIPPED_LINK, is_link_blocked, record_link_failure, record_link_success, record_link_parse
+from responseCache import ResponseCache, get_response_cache, price_block_hash
 import pandas as pd
-import sys
 
-def get_card_details(url, processed_count=None, total_cards=None):
-    """Fetches card details from PriceCharting and returns card title, set, and price."""
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+PRICECHARTING_HOST = os.getenv("PRICECHARTING_HOST", "pricecharting.com")  # Override only to point at a local stand-in
+RETRIES = int(os.getenv("FETCH_RETRIES", "5"))
+
+# A downloaded page that still needs parsing, plus what the cache needs to remember it
+FetchedPage = namedtuple("FetchedPage", ["url", "html", "response_headers", "content_hash"])
+
+# Single-flight: fetches in progress keyed by canonical link, so concurrent callers share one request
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def is_valid_pricecharting_url(url):
+    """Checks that the URL points at PriceCharting over http(s)."""
     parsed_url = urlparse(url)
-    if not (parsed_url.netloc.endswith("pricecharting.com") and parsed_url.scheme in ["http", "https"]):
+    return parsed_url.netloc.endswith(PRICECHARTING_HOST) and parsed_url.scheme in ["http", "https"]
+
+def parse_card_details(html):
+    """Extracts card title, set, and raw price text from a PriceCharting product page."""
+    with metrics.timer("parse"):
+        return extract_card_details(html)
+
+def check_unchanged(cache, cached, url, html, response_headers):
+    """
+    Hashes the price block of a 200 response. Returns (cached result, hash) when it matches the
+    cached entry, so the page needn't be parsed, otherwise (None, hash).
+    """
+    if cache is None:
+        return None, None
+
+    content_hash = price_block_hash(html)
+    if cached and cached["content_hash"] == content_hash:
+        record_link_success(url)
+        return cache.mark_unchanged(url, cached, response_headers.get("ETag"), response_headers.get("Last-Modified")), content_hash
+    return None, content_hash
+
+def remember_parsed(cache, url, response_headers, content_hash, result):
+    """Stores a freshly parsed result with its validators, and reports whether the page had a card to link health."""
+    record_link_parse(url, result[0] is not None)
+    if result[0] is None:
+        return  # Never cache a page we could not read
+    if cache is not None:
+        cache.store(url, response_headers.get("ETag"), response_headers.get("Last-Modified"), content_hash, result)
+
+def parse_with_cache(cache, cached, url, html, response_headers):
+    """Parses a 200 response, skipping the parse when the price block hash matches the cached entry."""
+    result, content_hash = check_unchanged(cache, cached, url, html, response_headers)
+    if result is not None:
+        return result
+
+    result = parse_card_details(html)
+    remember_parsed(cache, url, response_headers, content_hash, result)
+    return result
+
+def download_card_page(url, bypass_negative_cache=False):
+    """
+    Downloads a product page through the rate controller and response cache without parsing it.
+    Returns (result, None) when no parse is needed (cache hit or failure), or
+    (None, FetchedPage) when the caller must parse the page and pass it to remember_parsed.
+    bypass_negative_cache fetches a link even inside its failure TTL, e.g. one a user just pasted.
+    """
+    url = canonicalize_link(url)
+    if not is_valid_pricecharting_url(url):
         log(f"Invalid URL: {url}")
-        return None, None, None
+        return (None, None, None), None
+    if not bypass_negative_cache and is_link_blocked(url):
+        return (SKIPPED_LINK, None, None), None  # Failed recently; retried once its negative-cache TTL runs out
 
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    retries = 3
+    retries = RETRIES
+    cache = get_response_cache()
+    cached = cache.lookup(url) if cache else None
 
     for attempt in range(retries):
+        if attempt:
+            metrics.inc("retries")
+        probe = False
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            # The shared controller spaces requests per host and holds everyone back after a 429
+            with metrics.timer("rate_limit_wait"):
+                probe = wait_for_slot(url)
+
+            metrics.inc("requests")
+            request_start = time.perf_counter()
+            response = requests.get(url, headers={**HEADERS, **ResponseCache.validator_headers(cached)}, timeout=10)
+            # requests only exposes time-to-headers (connect + TTFB); the remainder is the body download
+            ttfb = response.elapsed.total_seconds()
+            metrics.observe("ttfb", ttfb)
+            metrics.observe("download", max(0.0, time.perf_counter() - request_start - ttfb))
+
+            record_response(url, response.status_code, response.headers.get("Retry-After"))
             if response.status_code == 429:
+                metrics.inc("rate_limited")
                 log(f"Rate limited. Retrying ({attempt+1}/{retries})...")
-                time.sleep(random.uniform(5, 10))
                 continue
+            if response.status_code == 304 and cached:
+                # Not modified: reuse the cached result without downloading or parsing
+                record_link_success(url)
+                return cache.mark_unchanged(url, cached, response.headers.get("ETag"), response.headers.get("Last-Modified")), None
             if response.status_code != 200:
-                return None, None, None
+                if response.status_code in NEGATIVE_STATUSES:
+                    record_link_failure(url, response.status_code, f"HTTP {response.status_code}")
+                return (None, None, None), None
 
-            soup = BeautifulSoup(response.text, 'html.parser')
+            html = response.text
+            result, content_hash = check_unchanged(cache, cached, url, html, response.headers)
+            if result is not None:
+                return result, None
+            return None, FetchedPage(url, html, response.headers, content_hash)
 
-            # Extract price
-            price_element = soup.find("span", class_="price js-price")
-            price = price_element.text.strip() if price_element else None
+        except requests.RequestException as e:
+            metrics.inc("request_errors")
+            record_request_error(url)
+            log(f"Request error: {e}")
+            time.sleep(random.uniform(1, 3))
+        finally:
+            if probe:
+                release_probe(url)  # Never leave a half-open circuit waiting on a probe that is gone
 
-            # Extract card title and set
-            title_element = soup.find("h1", id="product_name")
-            card_title = title_element.contents[0].strip() if title_element and title_element.contents else None
-            set_element = title_element.find("a") if title_element else None
-            card_set = set_element.text.strip() if set_element else None
+    return (None, None, None), None
 
-            if processed_count is not None and total_cards is not None:
-                sys.stdout.write(f"\r[Progress] {(processed_count+1)/total_cards*100:.2f}% ({processed_count+1}/{total_cards})")
-                sys.stdout.flush()
+def _download_and_parse(url, bypass_negative_cache=False):
+    result, page = download_card_page(url, bypass_negative_cache)
+    if page is None:
+        return result
 
-            return card_title, card_set, price
+    result = parse_card_details(page.html)
+    remember_parsed(get_response_cache(), page.url, page.response_headers, page.content_hash, result)
+    return result
 
-        except requests.RequestException as e:
-            log(f"Request error: {e}")
-            time.sleep(random.uniform(1, 3))
+def get_card_details(url, bypass_negative_cache=False):
+    """
+    Fetches card details from PriceCharting and returns card title, set, and price.
+    Concurrent calls for the same canonical link wait for the first one instead of fetching again.
+    """
+    key = canonicalize_link(url)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
 
-    return None, None, None
+    if not leader:
+        metrics.inc("singleflight_shared")
+        return future.result()
 
-def fetch_card_data(link, index):
+    try:
+        result = _download_and_parse(key, bypass_negative_cache)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+def build_card_result(index, card_title, card_set, price):
+    """Builds the (index, title, set, price) tuple used by update_excel."""
+    if card_title == SKIPPED_LINK:
+        return index, SKIPPED_LINK, None, None
+    if not card_title:
+        metrics.inc("failures")
+    return index, card_title or "Title not found", card_set or "Set not found", parse_price(price)
+
+def fetch_card_data(link, index, queued_at=None):
     """Fetch card details for a given link and ensure the price is numeric."""
+    if queued_at is not None:
+        metrics.observe("queue_wait", time.perf_counter() - queued_at)
+
     if pd.notna(link):
         card_title, card_set, price = get_card_details(link)
-
-        try:
-            cleaned_price = float(price.replace("$", "").replace(",", "")) if price else None
-        except ValueError:
-            cleaned_price = None
-
-        return index, card_title or "Title not found", card_set or "Set not found", cleaned_price
+        return build_card_result(index, card_title, card_set, price)
 
     return index, "Title not found", "Set not found", None
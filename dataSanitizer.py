@@ -1,4 +1,62 @@
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+# PriceCharting answers on both the bare and www host, over http and https; links are keyed on one spelling
+PRICECHARTING_CANONICAL_HOST = "www.pricecharting.com"
+
+# Everything in a price that isn't part of the number: currency symbols and codes, thousands separators, spaces
+PRICE_NOISE = re.compile(r"[^0-9.\-]")
+
 # Function to sanitize Excel data
 def sanitize_excel_input(value):
     """Prevents formula injection by prefixing potential Excel formulas with a single quote."""
     return f"'{value}" if isinstance(value, str) and value.startswith(("=", "+", "-", "@")) else value
+
+def canonicalize_link(link):
+    """
+    Normalizes a card URL to the key used by the fetcher, the database and the UI:
+    lowercase, no query string, fragment or trailing slash, and https://www. for PriceCharting.
+    Anything that isn't an http(s) URL is returned stripped but otherwise untouched.
+    """
+    if not isinstance(link, str):
+        return link
+    link = link.strip()
+    parts = urlsplit(link)
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.netloc:
+        return link
+
+    host = parts.netloc.lower()
+    if host in ("pricecharting.com", PRICECHARTING_CANONICAL_HOST):
+        scheme, host = "https", PRICECHARTING_CANONICAL_HOST
+    return urlunsplit((scheme, host, parts.path.lower().rstrip("/"), "", ""))
+
+def parse_price(value):
+    """Single-value form of normalize_prices: '$1,234.56' -> 1234.56; missing or unparseable prices -> None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return None if value != value else float(value)  # NaN != NaN
+    if not isinstance(value, str):
+        return None
+    try:
+        return float(PRICE_NOISE.sub("", value))
+    except ValueError:
+        return None
+
+def normalize_prices(values):
+    """
+    Parses a whole price column at once into a float64 Series, NaN where a price is missing or unparseable.
+    Numbers and plain numeric strings convert directly; only the leftovers ('$1,234.56', 'Price not found')
+    go through the string cleanup.
+    """
+    import pandas as pd
+
+    values = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        return values.astype("float64")
+
+    prices = pd.to_numeric(values, errors="coerce").astype("float64")
+    leftovers = prices.isna() & values.notna()
+    if leftovers.any():
+        cleaned = values[leftovers].astype(str).str.replace(PRICE_NOISE.pattern, "", regex=True)
+        prices[leftovers] = pd.to_numeric(cleaned, errors="coerce")
+    return prices
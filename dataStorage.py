@@ -1,31 +1,237 @@
-from dbManager import get_db_engine
+from dbManager import get_db_engine, ensure_price_history_partitions
 from utils import log
+from dataSanitizer import canonicalize_link
+import metrics
 from sqlalchemy import text
-import sys
+import os
+import time
+import queue
+import threading
 
-def store_data_in_db(card_title, card_set, price, link, processed_count=None, total_cards=None):
-    """Inserts or updates card data in PostgreSQL and logs progress."""
+# Batching settings for the background writer
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "500"))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "2.0"))
+DB_QUEUE_SIZE = int(os.getenv("DB_QUEUE_SIZE", "10000"))
+DB_RETRY_DELAY = float(os.getenv("DB_RETRY_DELAY", "5.0"))  # Seconds before a failed batch is retried once
+
+# Change-only upsert: cards is rewritten and a history row appended only when the price actually moved.
+# A missing price (failed fetch) never counts as a move, so it can't blank out a known price.
+# Takes one array per column and unnests them, so a whole batch is a single statement and round trip.
+UPSERT_CARD_QUERY = text("""
+    WITH changed AS (
+        INSERT INTO card_inventory.cards (card_title, card_set, price, link, updated_at)
+        SELECT card_title, card_set, price, link, NOW()
+        FROM unnest(
+            CAST(:card_titles AS TEXT[]), CAST(:card_sets AS TEXT[]),
+            CAST(:prices AS NUMERIC[]), CAST(:links AS TEXT[])
+        ) AS batch (card_title, card_set, price, link)
+        ON CONFLICT (link) DO UPDATE
+        SET price = EXCLUDED.price, updated_at = NOW()
+        WHERE EXCLUDED.price IS NOT NULL
+          AND card_inventory.cards.price IS DISTINCT FROM EXCLUDED.price
+        RETURNING link, price, updated_at
+    )
+    INSERT INTO card_inventory.price_history (link, price, observed_at)
+    SELECT link, price, updated_at FROM changed WHERE price IS NOT NULL;
+""")
+
+def upsert_params(rows):
+    """Turns card row dicts into the column arrays UPSERT_CARD_QUERY unnests."""
+    return {
+        "card_titles": [row["card_title"] for row in rows],
+        "card_sets": [row["card_set"] for row in rows],
+        "prices": [row["price"] for row in rows],
+        "links": [row["link"] for row in rows],
+    }
+
+def store_data_in_db(card_title, card_set, price, link):
+    """Inserts or updates card data in PostgreSQL."""
     try:
         engine = get_db_engine()
-        with engine.begin() as conn:  # ✅ Transaction handled automatically
-            query = text("""
-                INSERT INTO card_inventory.cards (card_title, card_set, price, link, updated_at)
-                VALUES (:card_title, :card_set, :price, :link, NOW())
-                ON CONFLICT (link) DO UPDATE
-                SET price = EXCLUDED.price, updated_at = NOW();
-            """)
-            conn.execute(query, {
+        ensure_price_history_partitions(engine)
+        with metrics.timer("db_write"), engine.begin() as conn:  # ✅ Transaction handled automatically
+            conn.execute(UPSERT_CARD_QUERY, upsert_params([{
                 "card_title": card_title,
                 "card_set": card_set,
                 "price": price,
-                "link": link
-            })
-
-        # ✅ First, overwrite the same progress line in the terminal
-        if processed_count is not None and total_cards is not None:
-            progress = (processed_count + 1) / total_cards * 100
-            sys.stdout.write(f"\r[Progress] {progress:.2f}% ({processed_count + 1}/{total_cards})   ")
-            sys.stdout.flush()  # ✅ Force immediate update
+                "link": canonicalize_link(link)
+            }]))
 
     except Exception as e:
         log(f"Database error: {e}")
+
+class BatchedCardWriter:
+    """
+    Buffers card upserts and writes them in batches from a background thread.
+    Rows are flushed when the batch is full or the flush interval elapses; close() drains everything.
+    A batch that still fails after its retry is kept in failed_rows, and flush()/close() return those rows.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue_size=None):
+        self.batch_size = batch_size or DB_BATCH_SIZE
+        self.flush_interval = flush_interval or DB_FLUSH_INTERVAL
+        self.queue = queue.Queue(maxsize=max_queue_size or DB_QUEUE_SIZE)
+        self.engine = get_db_engine()  # Doesn't connect; a DB outage surfaces (and is logged) per batch
+        self.rows_written = 0
+        self.batches_written = 0
+        self.failed_rows = []  # Every row dropped after its retry, for callers to act on
+        self._unreported = []  # Dropped rows not yet returned by flush()/close()
+        self._failed_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, card_title, card_set, price, link):
+        """Queues one card for upsert. Blocks when the queue is full so the scrape can't outrun the DB."""
+        if self._closed:
+            raise RuntimeError("BatchedCardWriter is closed")
+        self.queue.put({
+            "card_title": card_title,
+            "card_set": card_set,
+            "price": price,
+            "link": canonicalize_link(link)
+        })
+
+    def flush(self):
+        """
+        Blocks until every row submitted so far has been written or given up on.
+        Returns the rows that could not be written since the last flush()/close(), so callers never count them as saved.
+        """
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+        return self._take_failed()
+
+    def close(self):
+        """Writes any buffered rows, stops the writer thread and returns the rows not yet reported as failed."""
+        if self._closed:
+            return []
+        self._closed = True
+        self.queue.put(self._STOP)
+        self._thread.join()
+        return self._take_failed()
+
+    def _take_failed(self):
+        with self._failed_lock:
+            failed, self._unreported = self._unreported, []
+        return failed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        buffer = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                self._write(buffer)
+                return
+
+            if isinstance(item, threading.Event):
+                self._write(buffer)
+                buffer = []
+                deadline = time.monotonic() + self.flush_interval
+                item.set()
+                continue
+
+            if item is not None:
+                buffer.append(item)
+
+            if len(buffer) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(buffer)
+                buffer = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, rows):
+        if not rows:
+            return
+
+        # Keep the last result per link so one batch never updates the same row twice
+        rows = list({row["link"]: row for row in rows}.values())
+
+        params = upsert_params(rows)
+
+        # A failed batch is retried once after a pause, so a brief DB blip doesn't lose rows
+        for attempt in range(2):
+            try:
+                ensure_price_history_partitions(self.engine)  # Cached per process, also covers a run crossing month end
+                with metrics.timer("db_write"), self.engine.begin() as conn:
+                    conn.execute(UPSERT_CARD_QUERY, params)  # One multi-row statement in one transaction
+                metrics.inc("db_rows", len(rows))
+                self.rows_written += len(rows)
+                self.batches_written += 1
+                return
+            except Exception as e:
+                if attempt == 0:
+                    log(f"Database error writing batch of {len(rows)} cards, retrying in {DB_RETRY_DELAY:g}s: {e}")
+                    time.sleep(DB_RETRY_DELAY)
+                else:
+                    log(f"Database error writing batch of {len(rows)} cards, batch dropped: {e}")
+                    metrics.inc("db_rows_lost", len(rows))
+                    with self._failed_lock:
+                        self.failed_rows.extend(rows)
+                        self._unreported.extend(rows)
+
+def get_latest_prices():
+    """Returns (link, price, updated_at) for every card; cards always holds the latest observed price."""
+    query = text("""
+        SELECT link, price, updated_at
+        FROM card_inventory.cards
+        WHERE price IS NOT NULL;
+    """)
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        return conn.execute(query).fetchall()
+
+def get_price_at(link, timestamp):
+    """Returns (price, observed_at) in effect for one card at the given timestamp, or None."""
+    query = text("""
+        SELECT price, observed_at
+        FROM card_inventory.price_history
+        WHERE link = :link AND observed_at <= :timestamp
+        ORDER BY observed_at DESC
+        LIMIT 1;
+    """)
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        return conn.execute(query, {"link": canonicalize_link(link), "timestamp": timestamp}).fetchone()
+
+def get_prices_at(timestamp):
+    """Returns (link, price, observed_at) for every card as of the given timestamp, one index probe per card."""
+    query = text("""
+        SELECT c.link, h.price, h.observed_at
+        FROM card_inventory.cards c
+        CROSS JOIN LATERAL (
+            SELECT price, observed_at
+            FROM card_inventory.price_history
+            WHERE link = c.link AND observed_at <= :timestamp
+            ORDER BY observed_at DESC
+            LIMIT 1
+        ) h;
+    """)
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        return conn.execute(query, {"timestamp": timestamp}).fetchall()
+
+def get_price_highs(before):
+    """Returns (link, highest price) per card over all history observed before the given timestamp."""
+    query = text("""
+        SELECT link, MAX(price)
+        FROM card_inventory.price_history
+        WHERE observed_at < :before AND price IS NOT NULL
+        GROUP BY link;
+    """)
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        return conn.execute(query, {"before": before}).fetchall()
@@ -1,7 +1,13 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
 import os
+import time
+import threading
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from utils import log
+import metrics
+from dataSanitizer import canonicalize_link
 from urllib.parse import quote
 
 # Load environment variables from .env
@@ -14,17 +20,102 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = quote(os.getenv("DB_PASSWORD")) # Encode the password
 
+# Connection pool settings, shared by every engine in the process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Replace connections older than this (seconds)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:  # Checkouts happen on many threads at once
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            metrics.observe("db_pool_wait", waited)
+
+# Lazily created engines, one per database URL, reused for the life of the process
+_engines = {}
+_engines_lock = threading.Lock()
+_engines_pid = os.getpid()
+
+def _reset_engines_after_fork():
+    # A forked child must never reuse the parent's sockets; drop the pools without closing them
+    global _engines_pid
+    for engine in _engines.values():
+        engine.dispose(close=False)
+    _engines.clear()
+    _engines_pid = os.getpid()
+
+def _after_fork_in_child():
+    # The parent may have forked while another thread held the lock; the child's copy would never be released
+    global _engines_lock
+    _engines_lock = threading.Lock()
+    _reset_engines_after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
 # Establishes a connection to PostgreSQL
 def get_db_engine():
-    """Creates and returns an SQLAlchemy database engine."""
+    """Returns the process-wide SQLAlchemy engine, creating it and its connection pool on first use."""
     db_url = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    return create_engine(db_url, future=True)
+
+    with _engines_lock:
+        if os.getpid() != _engines_pid:  # Forked without the at-fork hook (e.g. an odd platform)
+            _reset_engines_after_fork()
+
+        engine = _engines.get(db_url)
+        if engine is None:
+            engine = _engines[db_url] = create_engine(
+                db_url,
+                future=True,
+                poolclass=TimedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+        return engine
+
+def get_pool_stats():
+    """Returns connection pool usage for each engine in this process, keyed by database name."""
+    stats = {}
+    with _engines_lock:
+        for engine in _engines.values():
+            pool = engine.pool
+            with pool._stats_lock:
+                checkouts, wait_seconds, max_wait_seconds = pool.checkouts, pool.wait_seconds, pool.max_wait_seconds
+            stats[engine.url.database] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(0, pool.overflow()),  # Negative while under pool_size
+                "checkouts": checkouts,
+                "wait_seconds": round(wait_seconds, 3),
+                "max_wait_seconds": round(max_wait_seconds, 3),
+            }
+    return stats
 
 # Provides a connection object for executing SQL queries
 def get_db_connection():
-    """Provides a connection object for executing SQL queries."""
-    engine = get_db_engine()
-    return engine.connect()  # Use `.connect()` for queries
+    """Checks a connection out of the shared engine's pool; closing it returns it to the pool."""
+    return get_db_engine().connect()
 
 # Initialize the database
 # This function creates the schema and table if they don't exist
@@ -44,11 +135,195 @@ def initialize_db():
     );
     """
 
+    """Serves the notifier's top-N query with an index scan instead of sorting every card."""
+    create_price_index_query = """
+    CREATE INDEX IF NOT EXISTS cards_price_desc
+    ON card_inventory.cards (price DESC) WHERE price IS NOT NULL;
+    """
+
+    """Creates the monthly-partitioned price history table if it doesn't exist."""
+    create_history_query = """
+    CREATE TABLE IF NOT EXISTS card_inventory.price_history (
+        link TEXT NOT NULL,
+        price NUMERIC(10,2),
+        observed_at TIMESTAMP NOT NULL DEFAULT NOW()
+    ) PARTITION BY RANGE (observed_at);
+    """
+    create_history_index_query = """
+    CREATE INDEX IF NOT EXISTS price_history_link_observed_at
+    ON card_inventory.price_history (link, observed_at);
+    """
+
+    """Creates the per-card refresh schedule used by the incremental scheduler mode."""
+    create_schedule_query = """
+    CREATE TABLE IF NOT EXISTS card_inventory.refresh_schedule (
+        link TEXT PRIMARY KEY,
+        next_due TIMESTAMP NOT NULL DEFAULT NOW(),
+        last_checked TIMESTAMP,
+        volatility DOUBLE PRECISION NOT NULL DEFAULT 0
+    );
+    """
+    create_schedule_index_query = """
+    CREATE INDEX IF NOT EXISTS refresh_schedule_next_due
+    ON card_inventory.refresh_schedule (next_due);
+    """
+
+    """Creates the job queue used by the distributed fetch mode."""
+    create_jobs_query = """
+    CREATE TABLE IF NOT EXISTS card_inventory.fetch_jobs (
+        run_id TEXT NOT NULL,
+        link TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        worker_id TEXT,
+        lease_expires_at TIMESTAMP,
+        card_title TEXT,
+        card_set TEXT,
+        price NUMERIC(10,2),
+        collected BOOLEAN NOT NULL DEFAULT FALSE,
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (run_id, link)
+    );
+    """
+    create_jobs_index_query = """
+    CREATE INDEX IF NOT EXISTS fetch_jobs_status
+    ON card_inventory.fetch_jobs (status, lease_expires_at);
+    """
+
+    """Remembers which price alerts were sent, so a card that stays past a threshold isn't re-announced."""
+    create_alerts_query = """
+    CREATE TABLE IF NOT EXISTS card_inventory.sent_alerts (
+        rule_key TEXT NOT NULL,
+        link TEXT NOT NULL,
+        price NUMERIC(10,2),
+        sent_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (rule_key, link)
+    );
+    """
+
     engine = get_db_engine() # Use SQLAlchemy engine
     try:
         with engine.begin() as conn:  # Use `.begin()` instead of `.connect()`
             conn.execute(text(create_schema_query))
             conn.execute(text(create_table_query))
+            conn.execute(text(create_price_index_query))
+            conn.execute(text(create_history_query))
+            conn.execute(text(create_history_index_query))
+            backfill_price_history(conn)
+            conn.execute(text(create_schedule_query))
+            conn.execute(text(create_schedule_index_query))
+            conn.execute(text(create_jobs_query))
+            conn.execute(text(create_jobs_index_query))
+            conn.execute(text(create_alerts_query))
+            canonicalize_stored_links(conn)
+        ensure_price_history_partitions(engine)
         log("Database initialized successfully in schema card_inventory.")
+        return True
     except Exception as e:
         log(f"Error initializing database: {e}")
+        return False
+
+_initialized = False
+_init_lock = threading.Lock()
+
+def ensure_db_initialized():
+    """Runs initialize_db once per process; later calls return immediately. A failed attempt is retried next call."""
+    global _initialized
+    with _init_lock:
+        if not _initialized:
+            _initialized = initialize_db()
+        return _initialized
+
+_ensured_partitions = set()  # Local months whose server-side partitions were already checked
+_partition_lock = threading.Lock()
+
+def create_price_history_partition(conn, month_start):
+    """Creates the price_history partition covering the month that starts at month_start."""
+    month_start = month_start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    name = f"price_history_{month_start:%Y_%m}"
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS card_inventory.{name}
+        PARTITION OF card_inventory.price_history
+        FOR VALUES FROM ('{month_start:%Y-%m-%d}') TO ('{month_end:%Y-%m-%d}');
+    """))
+    return name
+
+def ensure_price_history_partitions(engine):
+    """
+    Makes sure partitions exist for the database's current and next month, checked once per local month.
+    History rows are stamped with the server's NOW(), so the months come from the server's clock, not ours.
+    """
+    local_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    with _partition_lock:
+        if local_month in _ensured_partitions:
+            return  # Next month was created ahead, so a server clock a little ahead of ours is still covered
+        with engine.begin() as conn:
+            # LOCALTIMESTAMP is what NOW() becomes in the TIMESTAMP observed_at column
+            this_month = conn.execute(text("SELECT date_trunc('month', LOCALTIMESTAMP)::timestamp")).scalar()
+            for month_start in (this_month, (this_month + timedelta(days=32)).replace(day=1)):
+                create_price_history_partition(conn, month_start)
+        _ensured_partitions.add(local_month)
+
+def backfill_price_history(conn):
+    """Seeds an empty price_history with each card's current price so point-in-time lookups have a baseline."""
+    if conn.execute(text("SELECT EXISTS (SELECT 1 FROM card_inventory.price_history)")).scalar():
+        return
+
+    months = conn.execute(text("""
+        SELECT DISTINCT date_trunc('month', updated_at)::timestamp
+        FROM card_inventory.cards
+        WHERE price IS NOT NULL AND updated_at IS NOT NULL;
+    """)).scalars().all()
+    for month_start in months:
+        create_price_history_partition(conn, month_start)
+
+    conn.execute(text("""
+        INSERT INTO card_inventory.price_history (link, price, observed_at)
+        SELECT link, price, updated_at
+        FROM card_inventory.cards
+        WHERE price IS NOT NULL AND updated_at IS NOT NULL;
+    """))
+
+def canonicalize_stored_links(conn):
+    """
+    Rewrites links stored before canonicalization to their canonical key. When several spellings of one
+    card exist, the most recently updated cards row wins; their price history is merged under the new key.
+    Only links that could be non-canonical are read, so once migrated this is a cheap no-op on every start.
+    """
+    # Superset of what canonicalize_link changes: case, surrounding whitespace, query/fragment,
+    # trailing slash, http:// and the bare pricecharting.com host
+    candidate = """
+        link <> lower(link) OR link <> btrim(link, ' ' || chr(9) || chr(10) || chr(13))
+        OR link ~ '[?#]|/$|^http://|^https?://pricecharting[.]com'
+    """
+    links = conn.execute(text(f"""
+        SELECT link FROM card_inventory.cards WHERE {candidate}
+        UNION
+        SELECT link FROM card_inventory.refresh_schedule WHERE {candidate};
+    """)).scalars().all()
+    renames = [{"old": link, "new": canonicalize_link(link)} for link in links if canonicalize_link(link) != link]
+    if not renames:
+        return
+
+    conn.execute(text("CREATE TEMP TABLE link_renames (old TEXT PRIMARY KEY, new TEXT NOT NULL) ON COMMIT DROP;"))
+    conn.execute(text("INSERT INTO link_renames (old, new) VALUES (:old, :new);"), renames)
+
+    # Keep one row per canonical link before renaming, so the unique constraint can't trip
+    conn.execute(text("""
+        DELETE FROM card_inventory.cards c
+        USING (
+            SELECT c2.id, ROW_NUMBER() OVER (
+                PARTITION BY COALESCE(r.new, c2.link) ORDER BY c2.updated_at DESC NULLS LAST, c2.id DESC
+            ) AS rank
+            FROM card_inventory.cards c2
+            LEFT JOIN link_renames r ON r.old = c2.link
+        ) ranked
+        WHERE c.id = ranked.id AND ranked.rank > 1;
+    """))
+    conn.execute(text("UPDATE card_inventory.cards c SET link = r.new FROM link_renames r WHERE c.link = r.old;"))
+    conn.execute(text("UPDATE card_inventory.price_history h SET link = r.new FROM link_renames r WHERE h.link = r.old;"))
+    # Renamed cards are simply rescheduled under their new key on the next tick
+    conn.execute(text("DELETE FROM card_inventory.refresh_schedule s USING link_renames r WHERE s.link = r.old;"))
+    log(f"Canonicalized {len(renames)} stored card links.")
@@ -1,17 +1,52 @@
-import requests
 import os
+import json
+import math
+import time
+import queue
+import atexit
+import random
+import threading
 from utils import log
-import openai
-from sqlalchemy import text
-from dbManager import get_db_connection
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "15"))  # Seconds; openai also honours OPENAI_BASE_URL for a local stand-in
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
 
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Delivery settings for the background dispatcher
+NOTIFY_TIMEOUT = float(os.getenv("NOTIFY_TIMEOUT", "10"))  # Per webhook request
+NOTIFY_RETRIES = int(os.getenv("NOTIFY_RETRIES", "4"))
+NOTIFY_DRAIN_SECONDS = float(os.getenv("NOTIFY_DRAIN_SECONDS", "60"))  # How long exit waits for queued notifications
+
+# Generated summaries are reused for runs in the same value/count bucket. Set MESSAGE_CACHE_PATH="" to disable.
+MESSAGE_CACHE_PATH = os.getenv("MESSAGE_CACHE_PATH", "message_cache.json")
+VALUE_BUCKET_RATIO = 1.1  # Collection values within ~10% of each other share a message
+
+FALLBACK_TEMPLATES = (
+    "Your collection is worth {value} with {count} cards.",
+    "{count} cards tracked, {value} in ungraded value. Not bad at all!",
+    "The binder check is in: {count} cards adding up to {value}.",
+    "Another day, another price check: {value} across {count} cards.",
+)
+
+# The OpenAI client is built on first use, so importing this module stays cheap
+_client = None
+_client_lock = threading.Lock()
+
+def get_openai_client():
+    """Returns the shared OpenAI client, importing openai and creating the client on first call."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            import openai
+            _client = openai.OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=1)
+    return _client
 
 def fetch_top_5_expensive_cards():
-    """Retrieves the top 5 most expensive cards from the database."""
+    """Retrieves the top 5 most expensive cards from the database (served by the cards_price_desc index)."""
+    from sqlalchemy import text
+    from dbManager import get_db_connection
+
     query = text("""
         SELECT card_title, card_set, price
         FROM card_inventory.cards
@@ -28,30 +63,145 @@ def fetch_top_5_expensive_cards():
         log(f"Database error: {e}")
         return []
 
+def message_bucket(total_price, total_cards):
+    """Cache key for a summary: value on a ~10% log scale, card count to the nearest 10."""
+    value_bucket = int(math.log(total_price, VALUE_BUCKET_RATIO)) if total_price >= 1 else 0
+    return f"{value_bucket}:{int(round(total_cards, -1))}"
+
+def _load_message_cache():
+    try:
+        with open(MESSAGE_CACHE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_message_cache(cache):
+    tmp_path = f"{MESSAGE_CACHE_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, MESSAGE_CACHE_PATH)
+
+def _fill(template, total_price, total_cards):
+    # Plain replace rather than str.format, since generated text may contain other braces
+    return template.replace("{value}", f"${total_price:,.2f}").replace("{count}", str(total_cards))
+
+def valid_template(template):
+    """True if a generated template has both placeholders and no "$" of its own before {value}."""
+    return "{value}" in template and "{count}" in template and "${value}" not in template
+
 def generate_fun_message(total_price, total_cards):
-    """Generates a fun Discord message using OpenAI."""
-    prompt = f"""
-        Create a short, engaging message about a collection worth ${total_price:.2f}
-        with {total_cards} cards. Keep it under 250 characters and don't use quotations.
+    """
+    Generates a fun Discord message using OpenAI. The model writes a template with {value} and {count}
+    placeholders that is cached per value/count bucket; a canned template is used if the call fails
+    or the model's template is unusable.
+    """
+    bucket = message_bucket(total_price, total_cards)
+    fallback = FALLBACK_TEMPLATES[hash(bucket) % len(FALLBACK_TEMPLATES)]
+    cache = _load_message_cache() if MESSAGE_CACHE_PATH else {}
+    if bucket in cache and valid_template(cache[bucket]):  # Entries cached before validation may be bad
+        return _fill(cache[bucket], total_price, total_cards)
+
+    prompt = """
+        Create a short, engaging message about a trading card collection. Write the literal placeholder {value}
+        where the collection's dollar value goes and {count} where its number of cards goes.
+        Keep it under 250 characters and don't use quotations.
     """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
+        response = get_openai_client().chat.completions.create(
+            model=OPENAI_MODEL,
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=50
+            max_tokens=80
         )
-        return response.choices[0].message.content.strip()
+        template = response.choices[0].message.content.strip()
     except Exception as e:
         log(f"OpenAI error: {e}")
-        return f"Your collection is worth ${total_price:.2f} with {total_cards} cards."
+        return _fill(fallback, total_price, total_cards)
 
-def send_discord_message(total_price, total_cards):
-    """Sends a Discord embed notification with a dynamically generated description."""
-    if not DISCORD_WEBHOOK_URL:
-        log("Discord Webhook URL missing.")
-        return
+    if not valid_template(template):
+        log(f"Generated message template is missing {{value}}/{{count}} or adds its own $, not caching it: {template!r}")
+        return _fill(fallback, total_price, total_cards)
 
+    if MESSAGE_CACHE_PATH:
+        cache[bucket] = template
+        try:
+            _save_message_cache(cache)
+        except OSError as e:
+            log(f"Error saving message cache: {e}")
+    return _fill(template, total_price, total_cards)
+
+def post_webhook(url, payload, description="Discord message"):
+    """Posts a payload with a timeout, retrying network errors, 5xx and 429 (honouring Retry-After) with backoff."""
+    import requests
+
+    for attempt in range(NOTIFY_RETRIES):
+        try:
+            response = requests.post(url, json=payload, timeout=NOTIFY_TIMEOUT)
+        except requests.RequestException as e:
+            log(f"{description} failed ({attempt + 1}/{NOTIFY_RETRIES}): {e}")
+            time.sleep(2 ** attempt + random.uniform(0, 1))
+            continue
+
+        if response.status_code in (200, 204):
+            log(f"{description} sent successfully.")
+            return True
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = 2 ** attempt + random.uniform(0, 1)
+            time.sleep(min(delay, 60))
+            continue
+
+        log(f"Failed to send {description}. Response: {response.text}")
+        return False
+
+    log(f"Giving up on {description} after {NOTIFY_RETRIES} attempts.")
+    return False
+
+# Background dispatcher: notifications are queued and delivered by one daemon thread,
+# so a slow LLM or webhook never holds up a scrape or the scheduler loop
+_jobs = queue.Queue()
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def _dispatch_loop():
+    while True:
+        job = _jobs.get()
+        try:
+            job()
+        except Exception as e:
+            log(f"Notification error: {e}")
+        finally:
+            _jobs.task_done()
+
+def dispatch(job):
+    """Queues job (a callable) for the notification thread, starting the thread on first use."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = threading.Thread(target=_dispatch_loop, name="notifier", daemon=True)
+            _dispatcher.start()
+            atexit.register(flush_notifications)
+    _jobs.put(job)
+
+def flush_notifications(timeout=None):
+    """Waits up to timeout seconds for queued notifications to be delivered; returns True if all were."""
+    deadline = time.monotonic() + (NOTIFY_DRAIN_SECONDS if timeout is None else timeout)
+    while _jobs.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            log(f"Exiting with {_jobs.unfinished_tasks} notifications undelivered.")
+            return False
+        time.sleep(0.1)
+    return True
+
+def queue_webhook(url, payload, description="Discord message"):
+    """Queues a webhook post for background delivery."""
+    dispatch(lambda: post_webhook(url, payload, description))
+
+def build_summary_payload(total_price, total_cards):
+    """Builds the daily summary embed: generated description, totals and the top 5 cards."""
     top_cards = fetch_top_5_expensive_cards()
 
     # Generate a fun description dynamically
@@ -95,10 +245,12 @@ def send_discord_message(total_price, total_cards):
         ]
     }
 
-    payload = {"embeds": [embed]}
-    response = requests.post(DISCORD_WEBHOOK_URL, json=payload)
+    return {"embeds": [embed]}
 
-    if response.status_code == 204:
-        log("Discord message sent successfully.")
-    else:
-        log(f"Failed to send Discord message. Response: {response.text}")
+def send_discord_message(total_price, total_cards):
+    """Queues the summary notification; the description, top cards and webhook post all happen in the background."""
+    if not DISCORD_WEBHOOK_URL:
+        log("Discord Webhook URL missing.")
+        return
+
+    dispatch(lambda: post_webhook(DISCORD_WEBHOOK_URL, build_summary_payload(total_price, total_cards)))
@@ -1,27 +1,149 @@
-import pandas as pd
 import os
+import csv
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import text
 from dbManager import get_db_engine
 from utils import log
+import metrics
 
 
 # Load environment variables from .env
 EXPORT_PATH = os.getenv("EXPORT_PATH")
 
-def export_to_excel():
-    """Fetches all card data from PostgreSQL and exports it to an Excel file."""
-    query = "SELECT * FROM card_inventory.cards ORDER BY updated_at DESC;"
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+# "full" rewrites the whole export, "changed" writes only rows updated since the previous export
+EXPORT_MODE = os.getenv("EXPORT_MODE", "full").lower()
+# A row can commit after the export that should have caught it started, with an updated_at just before its
+# watermark. Changed exports re-read this many seconds before the watermark and skip rows already written.
+EXPORT_OVERLAP_SECONDS = float(os.getenv("EXPORT_OVERLAP_SECONDS", "300"))
+
+EXPORT_COLUMNS = ["id", "card_title", "card_set", "price", "link", "updated_at"]
+
+def _write_xlsx(path, columns, chunks):
+    """Streams rows into a write-only openpyxl workbook so memory stays flat."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for rows in chunks:
+        for row in rows:
+            sheet.append(list(row))
+    workbook.save(path)
+
+def _write_csv(path, columns, chunks):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+
+def _write_parquet(path, columns, chunks):
+    """Writes each chunk as a Parquet row group (requires pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("card_title", pa.string()),
+        ("card_set", pa.string()),
+        ("price", pa.float64()),
+        ("link", pa.string()),
+        ("updated_at", pa.timestamp("us")),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            data = list(zip(*rows))
+            arrays = [
+                pa.array([float(v) if v is not None else None for v in values] if name == "price" else values, type=schema.field(name).type)
+                for name, values in zip(columns, data)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+WRITERS = {
+    ".xlsx": _write_xlsx,
+    ".csv": _write_csv,
+    ".parquet": _write_parquet,
+}
+
+def _read_last_export(state_path):
+    """Returns (watermark, {(id, updated_at) already exported inside the overlap window}), or (None, set())."""
+    if not os.path.exists(state_path):
+        return None, set()
+    with open(state_path, encoding="utf-8") as f:
+        content = f.read().strip()
+    if not content.startswith("{"):
+        return datetime.fromisoformat(content), set()  # Written before the overlap window existed
+    state = json.loads(content)
+    return datetime.fromisoformat(state["exported_at"]), {tuple(row) for row in state["recent"]}
+
+def _write_last_export(state_path, exported_at, recent):
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"exported_at": exported_at.isoformat(), "recent": sorted(recent)}, f)
+
+def export_to_excel(export_path=None, changed_only=None):
+    """
+    Streams all card data from PostgreSQL into the export file; the format follows the extension
+    (.xlsx, .csv or .parquet). With changed_only, only rows updated since the previous export are
+    written, to a sibling "<name>_changes" file.
+    """
+    if changed_only is None:
+        changed_only = EXPORT_MODE == "changed"
 
     try:
+        # Ensure the path is valid and remove unwanted quotes
+        clean_export_path = (export_path or EXPORT_PATH).strip().replace('"', '')
+        root, ext = os.path.splitext(clean_export_path)
+        writer = WRITERS.get(ext.lower())
+        if writer is None:
+            log(f"Error exporting data: unsupported export format '{ext}'")
+            return
+
+        state_path = f"{clean_export_path}.last_export"
+        since, already_exported = _read_last_export(state_path) if changed_only else (None, set())
+        output_path = f"{root}_changes{ext}" if changed_only else clean_export_path
+
+        query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM card_inventory.cards"
+        if since is not None:
+            query += " WHERE updated_at > :since"
+        query += " ORDER BY updated_at DESC;"
+
         engine = get_db_engine()
         with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
+            export_started = conn.execute(text("SELECT NOW()::timestamp")).scalar()
+            overlap_start = export_started - timedelta(seconds=EXPORT_OVERLAP_SECONDS)
 
-        # Ensure the path is valid and remove unwanted quotes
-        clean_export_path = EXPORT_PATH.strip().replace('"', '')
+            # Server-side cursor: rows arrive in chunks instead of one giant DataFrame
+            result = conn.execution_options(stream_results=True, max_row_buffer=EXPORT_CHUNK_SIZE).execute(
+                text(query), {"since": since - timedelta(seconds=EXPORT_OVERLAP_SECONDS)} if since is not None else {}
+            )
+            row_count = 0
+            recent = set()  # Rows the next changed export will read again, so it can skip them
+
+            def chunks():
+                nonlocal row_count
+                for partition in result.partitions(EXPORT_CHUNK_SIZE):
+                    rows = []
+                    for row in partition:
+                        key = (row[0], row[5].isoformat()) if row[5] is not None else None
+                        if key in already_exported:
+                            continue
+                        if key is not None and row[5] >= overlap_start:
+                            recent.add(key)
+                        rows.append(row)
+                    row_count += len(rows)
+                    if rows:
+                        yield rows
+
+            with metrics.timer("export"):
+                writer(output_path, EXPORT_COLUMNS, chunks())
+
+        _write_last_export(state_path, export_started, recent)
 
-        # Ensure openpyxl is installed
-        df.to_excel(clean_export_path, index=False, engine="openpyxl")
-        log(f"Data successfully exported to {clean_export_path}")
+        log(f"Data successfully exported to {output_path} ({row_count} rows)")
 
     except Exception as e:
         log(f"Error exporting data: {e}")
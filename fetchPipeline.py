@@ -0,0 +1,178 @@
+import os
+import time
+import queue
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from dataFetcher import download_card_page, remember_parsed, build_card_result
+from dataSanitizer import parse_price
+from htmlExtractor import extract_card_details
+from responseCache import get_response_cache
+from utils import log
+import metrics
+
+# Stage sizes for the split fetch/parse pipeline
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "16"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARSE_BATCH_SIZE = int(os.getenv("PARSE_BATCH_SIZE", "32"))
+PAGE_QUEUE_SIZE = int(os.getenv("PAGE_QUEUE_SIZE", "256"))  # Downloaded pages waiting for a parse worker
+
+_DONE = object()
+
+def parse_batch(pages):
+    """
+    Runs in a parse worker process: turns [(index, html)] into [(index, raw, title, set, price, seconds)],
+    where raw is the extractor output the parent caches, price is already normalized and seconds is the
+    parse time, for the parent's metrics (the worker's own metrics never leave the process).
+    """
+    results = []
+    for index, html in pages:
+        start = time.perf_counter()
+        raw = extract_card_details(html)
+        seconds = time.perf_counter() - start
+        card_title, card_set, price = raw
+        results.append((index, raw, card_title or "Title not found", card_set or "Set not found", parse_price(price), seconds))
+    return results
+
+def _download(link, index, page_queue):
+    """I/O stage: downloads one page and hands it (or an already resolved result) to the parse stage."""
+    try:
+        if pd.notna(link):
+            result, page = download_card_page(link)
+        else:
+            result, page = (None, None, None), None
+
+        if page is None:
+            page_queue.put(("result", build_card_result(index, *result)))
+        else:
+            page_queue.put(("page", index, page))  # Blocks while the parse stage is behind
+    except Exception as e:
+        log(f"Error fetching card data: {e}")
+        page_queue.put(("result", build_card_result(index, None, None, None)))
+
+def run_pipeline(links, on_result, indices=None, fetch_workers=None, parse_workers=None, batch_size=None):
+    """
+    Fetches links with a pool of I/O threads and parses the pages in batches on a process pool.
+    on_result is called in the calling thread with (index, title, set, price) tuples, like fetch_card_data returns.
+    """
+    indices = list(indices) if indices is not None else list(range(len(links)))
+    fetch_workers = fetch_workers or FETCH_WORKERS
+    parse_workers = parse_workers or PARSE_WORKERS
+    batch_size = batch_size or PARSE_BATCH_SIZE
+    max_inflight = parse_workers * 2  # Batches submitted but not yet parsed
+
+    cache = get_response_cache()
+    page_queue = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+    pending_pages = {}  # index -> FetchedPage, kept in the parent for caching after the parse
+    inflight = {}  # future -> indices in its batch
+    batch = []
+    parse_broken = False
+
+    def fail_pages(batch_indices):
+        # The pages weren't read, so nothing is cached or blamed on the links
+        for index in batch_indices:
+            pending_pages.pop(index, None)
+            metrics.inc("failures")
+            on_result((index, "Title not found", "Set not found", None))
+
+    def mark_broken(e):
+        # A dead worker breaks the whole pool: stop downloading and fail whatever is still coming
+        nonlocal parse_broken
+        if not parse_broken:
+            log(f"Parse workers died, failing the remaining cards: {e}")
+            parse_broken = True
+            fetch_pool.shutdown(wait=False, cancel_futures=True)
+
+    def handle_parsed(future, batch_indices):
+        try:
+            parsed = future.result()
+        except Exception as e:
+            log(f"Error parsing card batch: {e}")
+            if isinstance(e, BrokenProcessPool):
+                mark_broken(e)
+            fail_pages(batch_indices)
+            return
+        for index, raw, card_title, card_set, price, seconds in parsed:
+            metrics.observe("parse", seconds)
+            page = pending_pages.pop(index)
+            remember_parsed(cache, page.url, page.response_headers, page.content_hash, raw)
+            if raw[0] is None:
+                metrics.inc("failures")
+            on_result((index, card_title, card_set, price))
+
+    def submit_batch():
+        nonlocal batch
+        if not batch:
+            return
+        pages, batch = batch, []
+        batch_indices = [index for index, _ in pages]
+        if not parse_broken:
+            try:
+                inflight[parse_pool.submit(parse_batch, pages)] = batch_indices
+                return
+            except BrokenProcessPool as e:
+                mark_broken(e)
+        fail_pages(batch_indices)
+
+    def drain(block=False):
+        if not inflight:
+            return
+        done, _ = wait(inflight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            handle_parsed(future, inflight.pop(future))
+
+    # The caller already runs threads (log listener, DB writer, progress), so workers are never plain-forked
+    # from this process: forkserver where available, spawn elsewhere
+    mp_context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+    with ProcessPoolExecutor(max_workers=parse_workers, mp_context=mp_context) as parse_pool:
+        # Bring the workers up (and through their imports) before fetching starts
+        parse_pool.submit(parse_batch, []).result()
+        fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers)
+        fetch_futures = {fetch_pool.submit(_download, link, idx, page_queue): idx for idx, link in zip(indices, links)}
+
+        def signal_done():
+            # Returns once every download has run or been cancelled (wait() isn't woken by a cancel)
+            fetch_pool.shutdown()
+            page_queue.put(_DONE)
+
+        threading.Thread(target=signal_done, name="fetch-done", daemon=True).start()
+
+        try:
+            while True:
+                drain()
+                if len(inflight) >= max_inflight:
+                    drain(block=True)  # Backpressure: stop pulling pages until a parse batch finishes
+                    continue
+
+                try:
+                    item = page_queue.get(timeout=0.05)
+                except queue.Empty:
+                    submit_batch()  # Don't let a partial batch wait for pages that aren't coming soon
+                    continue
+
+                if item is _DONE:
+                    break
+                if item[0] == "result":
+                    on_result(item[1])
+                    continue
+
+                _, index, page = item
+                pending_pages[index] = page
+                batch.append((index, page.html))
+                if len(batch) >= batch_size:
+                    submit_batch()
+
+            submit_batch()
+            while inflight:
+                drain(block=True)
+            fail_pages([index for future, index in fetch_futures.items() if future.cancelled()])
+        finally:
+            # Cancel downloads that haven't started and unblock any stuck on the full queue, so no thread outlives the run
+            fetch_pool.shutdown(wait=False, cancel_futures=True)
+            while not all(future.done() for future in fetch_futures):
+                try:
+                    page_queue.get(timeout=0.05)
+                except queue.Empty:
+                    pass
@@ -0,0 +1,146 @@
+import os
+from html.parser import HTMLParser
+
+# Extractor backend: "fast" (targeted streaming parse, falls back to bs4) or "bs4" (full BeautifulSoup tree)
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "fast").lower()
+
+TITLE_MARKER = 'id="product_name"'
+PRICE_MARKER = 'class="price js-price"'
+CHUNK_SIZE = 8192
+
+# Elements that never get an end tag, so they must not open a nesting level
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+class _Done(Exception):
+    """Raised by the streaming parser once every node we need has been read."""
+
+class _CardDetailsParser(HTMLParser):
+    """Streams through a product page collecting only h1#product_name, its <a>, and the first span.price.js-price."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.in_title = False
+        self.title_has_child = False
+        self.title_done = False
+        self.title_parts = None
+        self.set_depth = 0
+        self.set_parts = None
+        self.price_depth = 0
+        self.price_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in VOID_TAGS:
+            if self.in_title:
+                self.title_has_child = True
+            return
+
+        if self.in_title:
+            self.title_has_child = True
+            if tag == "a" and self.set_parts is None:
+                self.set_parts = []
+                self.set_depth = 1
+            elif self.set_depth:
+                self.set_depth += 1
+        elif tag == "h1" and attrs.get("id") == "product_name" and not self.title_done:
+            self.in_title = True
+            self.title_parts = []
+
+        if self.price_depth:
+            self.price_depth += 1
+        elif tag == "span" and self.price_parts is None and " ".join((attrs.get("class") or "").split()) == "price js-price":
+            self.price_parts = []
+            self.price_depth = 1
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if self.set_depth:
+            self.set_depth -= 1
+        if self.price_depth:
+            self.price_depth -= 1
+
+        if self.in_title and tag == "h1":
+            self.in_title = False
+            self.title_done = True
+
+        if self.title_done and self.price_parts is not None and not self.price_depth:
+            raise _Done()
+
+    def handle_data(self, data):
+        if self.in_title and not self.title_has_child:
+            self.title_parts.append(data)  # Text before the first child mirrors title_element.contents[0]
+        if self.set_depth:
+            self.set_parts.append(data)
+        if self.price_depth:
+            self.price_parts.append(data)
+
+def _start_offset(html):
+    """Finds where the nodes we need begin so the tokenizer can skip the page header."""
+    starts = []
+    for marker, tag in ((TITLE_MARKER, "<h1"), (PRICE_MARKER, "<span")):
+        idx = html.find(marker)
+        if idx == -1:
+            return 0  # Unexpected markup, stream the whole page
+        starts.append(html.rfind(tag, 0, idx))
+    return max(min(starts), 0)
+
+def extract_fast(html):
+    """
+    Targeted extractor: tokenizes only from the title/price section and stops as soon as they are read.
+    Returns (title, set, price text), or None if the page doesn't match the expected layout.
+    """
+    parser = _CardDetailsParser()
+    try:
+        for pos in range(_start_offset(html), len(html), CHUNK_SIZE):
+            parser.feed(html[pos:pos + CHUNK_SIZE])
+        parser.close()
+    except _Done:
+        pass
+
+    # A title that starts with a child element (or only blank text before one) is left to bs4
+    leading_text = "".join(parser.title_parts or []).strip()
+    if not parser.title_done or parser.title_has_child and not leading_text:
+        return None
+
+    card_title = leading_text or None
+    card_set = "".join(parser.set_parts).strip() if parser.set_parts is not None else None
+    price = "".join(parser.price_parts).strip() if parser.price_parts is not None else None
+    return card_title, card_set, price
+
+def extract_bs4(html):
+    """Reference extractor using a full BeautifulSoup parse."""
+    from bs4 import BeautifulSoup, NavigableString
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Extract price, falling back to the used price cell
+    price_element = soup.find("span", class_="price js-price")
+    if not price_element:
+        used_price_element = soup.find("td", id="used_price")
+        if used_price_element:
+            price_element = used_price_element.find("span", class_="price js-price")
+    price = price_element.text.strip() if price_element else None
+
+    # Extract card title and set
+    title_element = soup.find("h1", id="product_name")
+    # The title is the h1's first non-blank text of its own; children such as badges or the set link are skipped
+    title_texts = [node.strip() for node in title_element.contents if type(node) is NavigableString] if title_element else []
+    card_title = next((text for text in title_texts if text), None)
+    set_element = title_element.find("a") if title_element else None
+    card_set = set_element.text.strip() if set_element else None
+
+    return card_title, card_set, price
+
+EXTRACTORS = {
+    "fast": extract_fast,
+    "bs4": extract_bs4,
+}
+
+def extract_card_details(html, backend=None):
+    """Extracts (title, set, price text) from a product page with the configured backend."""
+    extractor = EXTRACTORS.get(backend or HTML_EXTRACTOR, extract_fast)
+    result = extractor(html)
+    if result is None:
+        result = extract_bs4(html)  # Fast path didn't recognise the page
+    return result
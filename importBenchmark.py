@@ -0,0 +1,72 @@
+import os
+import sys
+import argparse
+import subprocess
+
+# Cold-import budgets in milliseconds for the entry points we launch often
+IMPORT_BUDGETS_MS = {
+    "main": float(os.getenv("IMPORT_BUDGET_MAIN_MS", "300")),
+    "scraperUI": float(os.getenv("IMPORT_BUDGET_UI_MS", "200")),
+}
+
+# Heavy dependencies that must only load on first use, never while importing an entry point
+DEFERRED_MODULES = ("pandas", "sqlalchemy", "openai", "bs4", "aiohttp", "requests", "openpyxl", "pyarrow")
+
+def measure_import(module):
+    """
+    Imports module in a fresh interpreter under -X importtime.
+    Returns (total_ms, {top-level package: cumulative_ms}) for that import.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    # Lines look like "import time:       123 |       4567 |   package.sub"; nesting is shown by indentation
+    packages = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line.split(":", 1)[1].split("|")
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue  # Header row
+        stripped = name.strip()
+        if stripped == module:
+            total_us = cumulative_us
+        top = stripped.split(".")[0]
+        packages[top] = max(packages.get(top, 0), cumulative_us)
+
+    return total_us / 1000, {name: us / 1000 for name, us in packages.items()}
+
+def check_module(module, budget_ms, runs):
+    """Prints the best-of-runs import time and heaviest packages; returns False if over budget or a deferred dependency loaded."""
+    best_ms, packages = min((measure_import(module) for _ in range(runs)), key=lambda measured: measured[0])
+    heaviest = sorted(((name, ms) for name, ms in packages.items() if name != module), key=lambda item: item[1], reverse=True)[:8]
+    eager = [name for name in DEFERRED_MODULES if name in packages]
+
+    status = "OK" if best_ms <= budget_ms and not eager else "OVER BUDGET"
+    print(f"{module:<12} {best_ms:>8.1f} ms (budget {budget_ms:.0f} ms)  {status}")
+    for name, ms in heaviest:
+        print(f"    {name:<24} {ms:>8.1f} ms")
+    if eager:
+        print(f"    deferred dependencies imported eagerly: {', '.join(eager)}")
+    return status == "OK"
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks cold import time of the entry points against a budget.")
+    parser.add_argument("modules", nargs="*", default=list(IMPORT_BUDGETS_MS), help="Modules to measure")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module; the fastest run counts")
+    args = parser.parse_args()
+
+    ok = True
+    for module in args.modules:
+        ok = check_module(module, IMPORT_BUDGETS_MS.get(module, 300.0), args.runs) and ok
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
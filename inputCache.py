@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+from utils import log
+import metrics
+
+# Parsed copies of the workbook are kept next to it as <workbook>.cache.pkl; set INPUT_CACHE=0 to always parse
+INPUT_CACHE_ENABLED = os.getenv("INPUT_CACHE", "1").lower() in ("1", "true", "yes")
+
+# The columns the scraper works with, read with fixed dtypes instead of letting openpyxl values drive inference.
+# Prices stay object because the UI writes "Price not found" into the column.
+WORKBOOK_DTYPES = {
+    "Card Title": "object",
+    "Set": "object",
+    "Link": "object",
+    "Ungraded Price": "object",
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+def _cache_paths(file_path):
+    return f"{file_path}.cache.pkl", f"{file_path}.cache.json"
+
+def file_hash(file_path):
+    """SHA-256 of the file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _load_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(meta_path, meta):
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def parse_workbook(file_path):
+    """
+    Reads the workbook with openpyxl. Only the scraper's columns are read, unless the sheet has
+    extra columns of its own, which are kept so saving the workbook back can't drop them.
+    """
+    import pandas as pd
+
+    header = list(pd.read_excel(file_path, nrows=0).columns)
+    dtypes = {col: dtype for col, dtype in WORKBOOK_DTYPES.items() if col in header}
+    if all(col in WORKBOOK_DTYPES for col in header):
+        return pd.read_excel(file_path, usecols=list(dtypes), dtype=dtypes)
+    return pd.read_excel(file_path, dtype=dtypes)
+
+def remember_workbook(file_path, df, digest=None):
+    """Caches df as the parsed contents of file_path as it is on disk now, e.g. right after writing it."""
+    if not INPUT_CACHE_ENABLED:
+        return
+    data_path, meta_path = _cache_paths(file_path)
+    try:
+        stat = os.stat(file_path)
+        meta = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest or file_hash(file_path)}
+        if os.path.exists(meta_path):
+            os.remove(meta_path)  # Never leave old metadata pointing at a half-replaced pickle
+        df.to_pickle(f"{data_path}.tmp", protocol=5)
+        os.replace(f"{data_path}.tmp", data_path)
+        _write_meta(meta_path, meta)
+    except Exception as e:
+        log(f"Error writing input cache: {e}")
+
+def read_workbook(file_path):
+    """
+    Returns the workbook as a DataFrame, from the parsed-input cache when the file is unchanged.
+    Matching size and mtime is trusted as-is; otherwise a matching content hash still counts as a hit.
+    """
+    if not INPUT_CACHE_ENABLED:
+        return parse_workbook(file_path)
+
+    import pandas as pd
+
+    data_path, meta_path = _cache_paths(file_path)
+    meta = _load_meta(meta_path)
+    stat = os.stat(file_path)
+    digest = None
+
+    if meta and os.path.exists(data_path):
+        unchanged = meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns
+        if not unchanged and meta["size"] == stat.st_size:
+            digest = file_hash(file_path)  # Touched or copied, but possibly the same bytes
+            unchanged = digest == meta["hash"]
+            if unchanged:
+                meta["mtime_ns"] = stat.st_mtime_ns
+                _write_meta(meta_path, meta)
+
+        if unchanged:
+            try:
+                df = pd.read_pickle(data_path)
+                metrics.inc("input_cache_hits")
+                return df
+            except Exception as e:
+                log(f"Ignoring unreadable input cache: {e}")
+
+    metrics.inc("input_cache_misses")
+    df = parse_workbook(file_path)
+    remember_workbook(file_path, df, digest)
+    return df
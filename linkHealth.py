@@ -0,0 +1,216 @@
+import os
+import csv
+import time
+import sqlite3
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+from utils import log
+import metrics
+
+# Negative cache of card links that keep failing (404/410, or a page with no card on it). Set LINK_HEALTH_PATH="" to disable.
+LINK_HEALTH_PATH = os.getenv("LINK_HEALTH_PATH", "link_health.sqlite")
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", str(6 * 3600)))  # Seconds a link is skipped after its first failure
+NEGATIVE_CACHE_GROWTH = float(os.getenv("NEGATIVE_CACHE_GROWTH", "4"))  # TTL multiplier per further consecutive failure
+NEGATIVE_CACHE_MAX_TTL = float(os.getenv("NEGATIVE_CACHE_MAX_TTL", str(30 * 24 * 3600)))
+DEAD_LETTER_FAILURES = int(os.getenv("DEAD_LETTER_FAILURES", "3"))  # Consecutive failures before a link is listed for review
+
+# Statuses that say the page itself is gone; 5xx and timeouts are outages, left to the circuit breaker
+NEGATIVE_STATUSES = (404, 410)
+
+# A page with no card on it only counts against its link while most pages still parse. When most recent
+# parses come back empty, the extractor (or the site's markup) is the problem, not the links.
+EMPTY_PAGE_WINDOW = 50
+EMPTY_PAGE_MIN_PARSES = 20
+EMPTY_PAGE_RATE = 0.5
+
+# Title returned for a link skipped inside its TTL; callers leave the card's existing data untouched
+SKIPPED_LINK = "Skipped: failing link"
+
+DEAD_LETTER_COLUMNS = ["url", "status", "reason", "failures", "first_failed", "last_failed", "retry_after"]
+
+def negative_ttl(failures):
+    """Seconds to skip a link after its n-th consecutive failure."""
+    return min(NEGATIVE_CACHE_MAX_TTL, NEGATIVE_CACHE_TTL * NEGATIVE_CACHE_GROWTH ** (failures - 1))
+
+class LinkHealth:
+    """SQLite-backed failure record per canonical link; skip deadlines are mirrored in memory for lock-cheap checks."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS link_failures (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                reason TEXT,
+                failures INTEGER NOT NULL,
+                first_failed REAL NOT NULL,
+                last_failed REAL NOT NULL,
+                retry_after REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._retry_after = dict(self._conn.execute("SELECT url, retry_after FROM link_failures").fetchall())
+        self._parses = deque(maxlen=EMPTY_PAGE_WINDOW)  # Recent parse outcomes: True if the page had a card
+        self._extractor_suspect = False
+
+    def is_blocked(self, url):
+        """True while url is inside its negative-cache TTL."""
+        retry_after = self._retry_after.get(url)
+        return retry_after is not None and retry_after > time.time()
+
+    def record_failure(self, url, status, reason):
+        """Counts another consecutive failure and pushes the link's next attempt out by the grown TTL."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT failures, first_failed FROM link_failures WHERE url = ?", (url,)).fetchone()
+            failures, first_failed = (row[0] + 1, row[1]) if row else (1, now)
+            retry_after = now + negative_ttl(failures)
+            self._conn.execute("""
+                INSERT OR REPLACE INTO link_failures (url, status, reason, failures, first_failed, last_failed, retry_after)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (url, status, reason, failures, first_failed, now, retry_after))
+            self._conn.commit()
+            self._retry_after[url] = retry_after
+        metrics.inc("link_failures")
+        if failures == DEAD_LETTER_FAILURES:
+            log(f"Dead link after {failures} failures ({reason}): {url}")
+
+    def record_success(self, url):
+        """Forgets a link's failures once it answers with a card again."""
+        if url not in self._retry_after:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM link_failures WHERE url = ?", (url,))
+            self._conn.commit()
+            self._retry_after.pop(url, None)
+
+    def record_parse(self, url, found):
+        """Records whether a freshly parsed page had a card on it; an empty page is a link failure unless most are."""
+        with self._lock:
+            self._parses.append(found)
+            empty = self._parses.count(False)
+            suspect = len(self._parses) >= EMPTY_PAGE_MIN_PARSES and empty / len(self._parses) >= EMPTY_PAGE_RATE
+            if suspect and not self._extractor_suspect:
+                log(f"{empty} of the last {len(self._parses)} pages had no card details; the extractor may need updating. "
+                    f"Not counting empty pages against their links until parses recover.")
+            self._extractor_suspect = suspect
+
+        if found:
+            self.record_success(url)
+        elif not suspect:
+            self.record_failure(url, 200, "no card details on page")  # Delisted products can still answer 200
+
+    def stats(self):
+        """Counts links currently skipped and links failing often enough to be on the dead-letter list."""
+        now = time.time()
+        with self._lock:
+            dead = self._conn.execute("SELECT COUNT(*) FROM link_failures WHERE failures >= ?", (DEAD_LETTER_FAILURES,)).fetchone()[0]
+        return {"blocked": sum(1 for retry_after in list(self._retry_after.values()) if retry_after > now), "dead": dead}
+
+    def forget(self, url):
+        """Clears a link by hand, e.g. after fixing it in the workbook; returns True if it was tracked."""
+        tracked = url in self._retry_after
+        self.record_success(url)
+        return tracked
+
+    def forget_all(self):
+        """Clears every tracked link, e.g. after an extractor fix; returns how many were tracked."""
+        with self._lock:
+            cleared = self._conn.execute("DELETE FROM link_failures").rowcount
+            self._conn.commit()
+            self._retry_after.clear()
+        return cleared
+
+    def dead_letters(self, min_failures=None):
+        """Returns the failure rows of links with at least min_failures consecutive failures, worst first."""
+        with self._lock:
+            return self._conn.execute(f"""
+                SELECT {", ".join(DEAD_LETTER_COLUMNS)}
+                FROM link_failures
+                WHERE failures >= ?
+                ORDER BY failures DESC, last_failed DESC
+            """, (DEAD_LETTER_FAILURES if min_failures is None else min_failures,)).fetchall()
+
+    def export_dead_letters(self, path, min_failures=None):
+        """Writes the dead-letter list to a CSV for review and returns how many links it holds."""
+        rows = self.dead_letters(min_failures)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(DEAD_LETTER_COLUMNS)
+            for url, status, reason, failures, first_failed, last_failed, retry_after in rows:
+                writer.writerow([url, status, reason, failures] + [
+                    datetime.fromtimestamp(ts).isoformat(timespec="seconds") for ts in (first_failed, last_failed, retry_after)
+                ])
+        return len(rows)
+
+_health = None
+_health_lock = threading.Lock()
+
+def get_link_health():
+    """Returns the process-wide link failure store, or None when LINK_HEALTH_PATH is empty."""
+    global _health
+    if not LINK_HEALTH_PATH:
+        return None
+    with _health_lock:
+        if _health is None:
+            _health = LinkHealth(LINK_HEALTH_PATH)
+    return _health
+
+def is_link_blocked(url):
+    """True if url failed recently enough that fetching it again would be wasted."""
+    health = get_link_health()
+    if health is None or not health.is_blocked(url):
+        return False
+    metrics.inc("dead_link_skips")
+    return True
+
+def record_link_failure(url, status, reason):
+    """Records a failed fetch of url in the negative cache."""
+    health = get_link_health()
+    if health is not None:
+        health.record_failure(url, status, reason)
+
+def record_link_success(url):
+    """Clears url from the negative cache."""
+    health = get_link_health()
+    if health is not None:
+        health.record_success(url)
+
+def record_link_parse(url, found):
+    """Records whether a freshly parsed page of url had a card on it."""
+    health = get_link_health()
+    if health is not None:
+        health.record_parse(url, found)
+
+def get_link_stats():
+    """Link health summary for the run log; zeros when tracking is disabled."""
+    health = get_link_health()
+    return health.stats() if health is not None else {"blocked": 0, "dead": 0}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reviews card links that keep failing.")
+    parser.add_argument("--export", metavar="CSV", help="Write the dead-letter list to this CSV")
+    parser.add_argument("--min-failures", type=int, help=f"Consecutive failures to be listed (default {DEAD_LETTER_FAILURES})")
+    parser.add_argument("--forget", nargs="+", metavar="URL", help="Clear these links so the next run fetches them")
+    parser.add_argument("--forget-all", action="store_true", help="Clear every tracked link, e.g. after an extractor fix")
+    args = parser.parse_args()
+
+    from dataSanitizer import canonicalize_link
+
+    health = get_link_health()
+    if health is None:
+        parser.error("LINK_HEALTH_PATH is empty, so no failures are tracked.")
+    if args.forget_all:
+        print(f"Forgot {health.forget_all()} tracked links.")
+    for url in args.forget or []:
+        print(f"{'forgot' if health.forget(canonicalize_link(url)) else 'not tracked'}: {url}")
+    if args.export:
+        print(f"Exported {health.export_dead_letters(args.export, args.min_failures)} dead links to {args.export}")
+    elif not args.forget and not args.forget_all:
+        for url, status, reason, failures, *_ in health.dead_letters(args.min_failures):
+            print(f"{failures:>3}  {status or '-':>3}  {reason}  {url}")
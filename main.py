@@ -1,22 +1,24 @@
 import os
 import sys
 import time
-import shutil
 import pytz
 import schedule
-import pandas as pd  # type: ignore
 from datetime import datetime
-from threading import Lock
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Importing modules from the project
-import dbManager
-from dataFetcher import fetch_card_data
+# Importing modules from the project. Anything that pulls in pandas, SQLAlchemy, requests or openai
+# is imported inside the function that needs it, so starting the scheduler or a one-off run stays fast.
+from dataSanitizer import canonicalize_link, normalize_prices
+from rateLimiter import get_rate_stats
+from linkHealth import SKIPPED_LINK, get_link_stats
+from runJournal import RunJournal
+from progressReporter import ProgressReporter
 from utils import log
-from excelExport import export_to_excel
-from excelBackupCleaner import cleanup_old_backups
-from dataStorage import store_data_in_db
-from discordNotifier import send_discord_message
+import metrics
+from backupStore import backup_workbook
+from inputCache import read_workbook, remember_workbook
+from priceGuide import PRICE_GUIDE_SOURCE
+from priceAlerts import PRICE_ALERT_RULES
 
 # Define Pacific Time Zone
 PACIFIC_TZ = pytz.timezone("America/Los_Angeles")
@@ -24,8 +26,13 @@ PACIFIC_TZ = pytz.timezone("America/Los_Angeles")
 # Fetch the environment variable for file path
 FILE_PATH = os.getenv("FILE_PATH")
 
-# Initialize the PostgreSQL database
-dbManager.initialize_db()
+# Fetch mode: "thread" (default), "async" for the pooled asyncio fetcher,
+# "pipeline" for I/O threads feeding a process pool of parsers, or "distributed" to hand the links to
+# workQueue workers on any number of hosts (this process then only coordinates)
+FETCH_MODE = os.getenv("FETCH_MODE", "thread").lower()
+
+# Scheduler mode: "daily" full rescrape at 07:00, or "incremental" refresh of the most overdue cards every tick
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "daily").lower()
 
 def get_file_path():
     """Retrieve the file path from environment variables."""
@@ -35,21 +42,102 @@ def get_file_path():
         sys.exit(1)
     return file_path
 
-def backup_excel(file_path):
-    """Creates a backup of the existing Excel file before modifying."""
-    backup_path = file_path.replace(".xlsx", f"_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
-    shutil.copy(file_path, backup_path)
-    log(f"Backup created: {backup_path}")
-    return backup_path
+def group_rows_by_link(df):
+    """Maps each canonical link to the workbook rows that hold it, in first-seen order."""
+    rows_by_link = {}
+    for row, link in df["Link"].dropna().items():
+        rows_by_link.setdefault(canonicalize_link(str(link)), []).append(row)
+    return rows_by_link
+
+class CardResults:
+    """
+    Columnar buffer of fetched cards with one preallocated slot per unique link. Results are dropped into
+    their slot as they arrive and written to the workbook afterwards in one vectorized assignment per column,
+    instead of per-cell DataFrame writes inside the fetch loop.
+    """
+
+    def __init__(self, size):
+        import numpy as np
+
+        self.filled = np.zeros(size, dtype=bool)
+        self.titles = np.empty(size, dtype=object)
+        self.sets = np.empty(size, dtype=object)
+        self.prices = np.full(size, np.nan, dtype="float64")
+
+    def add(self, index, card_title, card_set, price):
+        """Records the result for the link at index."""
+        self.filled[index] = True
+        self.titles[index] = card_title
+        self.sets[index] = card_set
+        self.prices[index] = float(price) if price is not None else float("nan")
+
+    def apply(self, df, rows_by_link):
+        """
+        Writes every recorded card into all workbook rows holding its link; rows_by_link must list the links
+        in slot order. The price column comes out as float64, with any leftover text prices normalized.
+        """
+        import numpy as np
+
+        counts = np.fromiter((len(rows) for rows in rows_by_link.values()), dtype=np.int64, count=len(rows_by_link))
+        slots = np.repeat(np.arange(len(rows_by_link)), counts)
+        positions = df.index.get_indexer([row for rows in rows_by_link.values() for row in rows])
+        recorded = self.filled[slots]
+        slots, positions = slots[recorded], positions[recorded]
+
+        for column, values in (("Card Title", self.titles), ("Set", self.sets)):
+            column_values = df[column].to_numpy(dtype=object, copy=True)
+            column_values[positions] = values[slots]
+            df[column] = column_values
+
+        prices = normalize_prices(df["Ungraded Price"]).to_numpy(copy=True)
+        prices[positions] = self.prices[slots]
+        df["Ungraded Price"] = prices
+
+def apply_price_guide(df, rows_by_link, pending, on_result):
+    """
+    Feeds cards found in the price guide to on_result and returns the pending (index, link) pairs it didn't
+    cover. Matches on the optional "Product ID" column first, then on the canonical link.
+    """
+    import pandas as pd
+    from priceGuide import ingest_price_guide
+
+    product_ids = None
+    if "Product ID" in df.columns:
+        ids = df["Product ID"]
+        product_ids = {link: ids.at[rows[0]] for link, rows in rows_by_link.items() if pd.notna(ids.at[rows[0]])}
+
+    try:
+        found = ingest_price_guide([link for _, link in pending], product_ids=product_ids)
+    except Exception as e:
+        log(f"Error reading price guide, scraping every card instead: {e}")
+        return pending
+
+    for idx, link in pending:
+        if link in found:
+            card_title, card_set, price = found[link]
+            on_result((idx, card_title or "Title not found", card_set or "Set not found", price))
+    return [(idx, link) for idx, link in pending if link not in found]
+
+def send_price_alerts(previous_df, df, run_started):
+    """Runs the price alert rules over this run's changes; alert failures never fail the run."""
+    if previous_df is None:
+        return
+    from priceAlerts import check_price_alerts
+
+    try:
+        check_price_alerts(previous_df, df, run_started)
+    except Exception as e:
+        log(f"Error checking price alerts: {e}")
 
 def load_excel(file_path):
-    """Loads the Excel file and validates required columns."""
+    """Loads the Excel file (from the parsed-input cache when unchanged) and validates required columns."""
     if not os.path.exists(file_path):
         log("Error: Excel file not found.")
         return None
 
     log(f"Loading Excel file: {file_path}")
-    df = pd.read_excel(file_path)
+    with metrics.timer("excel_load"):
+        df = read_workbook(file_path)
 
     required_columns = ["Card Title", "Set", "Link", "Ungraded Price"]
     if not all(col in df.columns for col in required_columns):
@@ -63,68 +151,240 @@ def update_excel(file_path):
     Reads the Excel file, fetches pricing data in parallel, updates the database, and exports to a new Excel file.
     Returns total price and number of cards updated.
     """
+    import dbManager
+    from dataFetcher import fetch_card_data
+    from dataStorage import BatchedCardWriter
+    from excelExport import export_to_excel
+
+    metrics.reset()
+    dbManager.ensure_db_initialized()
     df = load_excel(file_path)
     if df is None:
         return None, None
 
-    # Create a backup before modifying
-    backup_excel(file_path)
-    cleanup_old_backups(file_path)  # Cleanup old backups
+    # Snapshot the workbook before modifying; unchanged workbooks aren't stored again
+    backup_workbook(file_path)
+    previous_df = df.copy() if PRICE_ALERT_RULES else None  # Prices before this run, for the alert rules
+    run_started = datetime.now()
 
-    # Extract links
-    links = df["Link"].dropna().tolist()
+    # Fetch each unique card once; duplicate rows and trivially different URLs share the result
+    rows_by_link = group_rows_by_link(df)
+    links = list(rows_by_link)
     total_cards = len(links)
-    processed_count = 0
-    lock = Lock()
+    duplicate_rows = sum(len(rows) for rows in rows_by_link.values()) - total_cards
+    if duplicate_rows:
+        log(f"{duplicate_rows} duplicate rows share a link with another row and won't be fetched separately.")
+
+    # Resume from the run journal if a previous run died partway through
+    journal = RunJournal.for_workbook(file_path)
+    completed = journal.completed()
+    pending = [(idx, link) for idx, link in enumerate(links) if link not in completed]
+    if completed:
+        log(f"Resuming interrupted run: {total_cards - len(pending)} of {total_cards} cards already fetched.")
 
     start_time = time.time()
 
-    # Fetch card data using multithreading
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_index = {executor.submit(fetch_card_data, link, idx): idx for idx, link in enumerate(links)}
+    results = CardResults(total_cards)
+
+    def handle_result(result, checkpoint=True, store=True):
+        """Buffers one fetched card for the workbook and queues it for the database."""
+        try:
+            index, card_title, card_set, price = result
+            link = links[index]
+            if card_title == SKIPPED_LINK:
+                progress.advance()  # Failing link inside its negative-cache TTL: keep the rows' last known data
+                return
+
+            # Buffered until fetching finishes, then written to every Excel row holding this card at once
+            results.add(index, card_title, card_set, price)
+
+            # Queue the card for the batched PostgreSQL writer; the change-only upsert makes unchanged cards cheap
+            if store:
+                writer.submit(card_title, card_set, price, link)
+
+            # Checkpoint the result so a crash doesn't cost this card again. Failed fetches aren't checkpointed,
+            # so a resumed run retries them (they are usually the ones cut off by the outage that ended the run).
+            if checkpoint and card_title != "Title not found":
+                journal.record(link, card_title, card_set, price)
+
+            progress.advance()
+        except Exception as e:
+            log(f"Error processing card data: {e}")
+
+    # The writer drains its queue on exit, so every fetched row reaches the database
+    with BatchedCardWriter() as writer, ProgressReporter(total_cards) as progress:
+        # Merge cards finished before the interruption; re-queueing them is harmless with change-only upserts
+        for idx, link in enumerate(links):
+            if link in completed:
+                handle_result((idx, *completed[link]), checkpoint=False)
+
+        if PRICE_GUIDE_SOURCE and pending:
+            # Bulk mode: take every card the price guide covers, and scrape only what it doesn't
+            pending = apply_price_guide(df, rows_by_link, pending, handle_result)
+
+        if FETCH_MODE == "async":
+            # Opt-in asyncio mode: one pooled keep-alive session instead of a thread per request
+            from asyncFetcher import fetch_all_card_data
+            fetch_all_card_data([link for _, link in pending], on_result=handle_result, indices=[idx for idx, _ in pending])
+        elif FETCH_MODE == "pipeline":
+            # Staged mode: downloads on I/O threads, CPU-bound parsing spread across processes
+            from fetchPipeline import run_pipeline
+            run_pipeline([link for _, link in pending], on_result=handle_result, indices=[idx for idx, _ in pending])
+        elif FETCH_MODE == "distributed":
+            # Workers already wrote each card through the upsert, so results only update the workbook
+            from workQueue import fetch_distributed
+            fetch_distributed(os.path.abspath(file_path), [link for _, link in pending],
+                              on_result=lambda result: handle_result(result, store=False), indices=[idx for idx, _ in pending])
+        else:
+            # Fetch card data using multithreading
+            with ThreadPoolExecutor(max_workers=10) as executor:
+                future_to_index = {executor.submit(fetch_card_data, link, idx, time.perf_counter()): idx for idx, link in pending}
+
+                for future in as_completed(future_to_index):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        log(f"Error processing card data: {e}")
+                        continue
+                    handle_result(result)
 
-        for future in as_completed(future_to_index):
-            try:
-                index, card_title, card_set, price = future.result()
+    elapsed_time = time.time() - start_time
+    log(f"Scraping completed in {elapsed_time:.2f} seconds.")
+    if writer.failed_rows:
+        # The workbook still gets these prices, and the next run's upsert writes them to the database
+        log(f"{len(writer.failed_rows)} cards could not be saved to the database this run.")
+    for host, stats in get_rate_stats().items():
+        log(f"Rate controller {host}: {stats['rate']} req/s, {stats['requests']} requests, "
+            f"{stats['throttled']} throttled, {stats['wait_seconds']}s waiting, {stats['breaker_trips']} circuit breaker trips.")
+    link_stats = get_link_stats()
+    if link_stats["dead"]:
+        log(f"{link_stats['blocked']} failing links skipped until their retry time; {link_stats['dead']} look dead "
+            f"(review with: python linkHealth.py --export dead_links.csv).")
+    for database, stats in dbManager.get_pool_stats().items():
+        log(f"DB pool {database}: {stats['checkouts']} checkouts, {stats['checked_out']} checked out, "
+            f"{stats['overflow']} overflow, {stats['wait_seconds']}s waiting (max {stats['max_wait_seconds']}s).")
+
+    # Apply every result in one pass; this also normalizes prices the run didn't touch
+    with metrics.timer("apply_results"):
+        results.apply(df, rows_by_link)
 
-                # Update the Excel DataFrame
-                df.at[index, "Card Title"] = card_title
-                df.at[index, "Set"] = card_set
-                df.at[index, "Ungraded Price"] = float(price) if price is not None else None
+    total_price = df["Ungraded Price"].sum()
+    total_cards = df["Ungraded Price"].count()
 
-                # Store Data in PostgreSQL
-                store_data_in_db(card_title, card_set, price, links[index], processed_count, total_cards)
+    # Save updated file
+    with metrics.timer("excel_save"):
+        df.to_excel(file_path, index=False)
+    remember_workbook(file_path, df)  # The next run loads what we just wrote without reparsing it
+    log(f"Excel file updated: {file_path}")
+    send_price_alerts(previous_df, df, run_started)
+    journal.finish()  # Results are in the workbook now, the next run starts fresh
 
-                # Update progress
-                with lock:
-                    processed_count += 1
-                    progress = (processed_count / total_cards) * 100
-                    sys.stdout.write(f"\r[Progress] {progress:.2f}% ({processed_count}/{total_cards})")
-                    sys.stdout.flush()
+    # Export database data to Excel
+    export_to_excel()
+
+    metrics.export_run_metrics({
+        "cards": total_cards,
+        "scrape_seconds": round(elapsed_time, 3),
+        "rate_controller": get_rate_stats(),
+        "db_pool": dbManager.get_pool_stats(),
+    })
+
+    return total_price, total_cards
+
+def refresh_due_cards(file_path):
+    """
+    Incremental mode tick: refreshes only the most overdue cards within the per-tick budget,
+    then reschedules each one based on its value and how much its price moved.
+    """
+    import pandas as pd
+    import dbManager
+    from dataFetcher import fetch_card_data
+    from dataStorage import BatchedCardWriter
+    from refreshScheduler import register_links, get_due_links, record_refreshes
+
+    dbManager.ensure_db_initialized()
+    df = load_excel(file_path)
+    if df is None:
+        return
+
+    rows_by_link = group_rows_by_link(df)
+    register_links(rows_by_link.keys())
+    volatilities = get_due_links(links=rows_by_link.keys())
+    if not volatilities:
+        log("No cards due for refresh.")
+        return
+
+    due_links = list(volatilities)
+    previous_df = df.copy() if PRICE_ALERT_RULES else None
+    run_started = datetime.now()
+    old_prices = normalize_prices(df["Ungraded Price"])
+    results = CardResults(len(due_links))
+    refreshed = {}
+
+    start_time = time.time()
+    with BatchedCardWriter() as writer, ProgressReporter(len(due_links), "Refresh") as progress, \
+            ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(fetch_card_data, link, idx) for idx, link in enumerate(due_links)]
+
+        for future in as_completed(futures):
+            try:
+                index, card_title, card_set, price = future.result()
             except Exception as e:
                 log(f"Error processing card data: {e}")
+                continue
 
-    elapsed_time = time.time() - start_time
-    log(f"\nScraping completed in {elapsed_time:.2f} seconds.")
+            link = due_links[index]
+            old_price = old_prices.at[rows_by_link[link][0]]
+            if card_title == SKIPPED_LINK:
+                # Rows keep their last known data; the card comes due again after the minimum interval
+                refreshed[link] = (link, None if pd.isna(old_price) else float(old_price), None)
+                progress.advance()
+                continue
 
-    # Clean price formatting
-    df["Ungraded Price"] = df["Ungraded Price"].astype(str).str.replace("$", "").str.replace(",", "")
-    df["Ungraded Price"] = pd.to_numeric(df["Ungraded Price"], errors='coerce')
+            results.add(index, card_title, card_set, price)
+            writer.submit(card_title, card_set, price, link)
 
-    total_price = df["Ungraded Price"].sum()
-    total_cards = df["Ungraded Price"].count()
+            refreshed[link] = (link, None if pd.isna(old_price) else float(old_price), price)
+            progress.advance()
 
-    # Save updated file
+    # Cards the writer couldn't save aren't rescheduled, so they stay due and the next tick stores them
+    for row in writer.failed_rows:
+        refreshed.pop(row["link"], None)
+    record_refreshes(list(refreshed.values()), volatilities)
+    log(f"Refreshed {len(refreshed)} due cards in {time.time() - start_time:.2f} seconds.")
+
+    results.apply(df, {link: rows_by_link[link] for link in due_links})
     df.to_excel(file_path, index=False)
+    remember_workbook(file_path, df)
     log(f"Excel file updated: {file_path}")
+    send_price_alerts(previous_df, df, run_started)
 
-    # Export database data to Excel
+def send_daily_summary():
+    """Incremental mode: backs up the workbook, exports the DB and sends the Discord summary once a day."""
+    import dbManager
+    from excelExport import export_to_excel
+    from discordNotifier import send_discord_message
+
+    dbManager.ensure_db_initialized()
+    file_path = get_file_path()
+    df = load_excel(file_path)
+    if df is None:
+        return
+
+    backup_workbook(file_path)
     export_to_excel()
 
-    return total_price, total_cards
+    prices = normalize_prices(df["Ungraded Price"])
+    send_discord_message(prices.sum(), prices.count())
+
+def run_refresh_tick():
+    """Scheduled job wrapper for refresh_due_cards."""
+    refresh_due_cards(get_file_path())
 
 def run_script():
     """Runs the update_excel process and sends a Discord notification."""
+    from discordNotifier import send_discord_message
+
     log("Scheduled script execution started")
     file_path = get_file_path()
     total_price, total_cards = update_excel(file_path)
@@ -146,15 +406,32 @@ def display_next_run():
         schedule.run_pending()
         time.sleep(60)  # Check every minute
 
-# Schedule the script to run at 7:00 AM Pacific Time daily
-schedule.every().day.at("07:00").do(run_script)
+def schedule_jobs():
+    """Registers the scheduled jobs for the configured scheduler mode."""
+    if SCHEDULER_MODE == "incremental":
+        from refreshScheduler import REFRESH_TICK_MINUTES
+
+        # Spread the request budget across the day instead of one 7 AM burst
+        schedule.every(REFRESH_TICK_MINUTES).minutes.do(run_refresh_tick)
+        schedule.every().day.at("07:00").do(send_daily_summary)
+    else:
+        # Schedule the script to run at 7:00 AM Pacific Time daily
+        schedule.every().day.at("07:00").do(run_script)
 
 if __name__ == "__main__":
     file_path = get_file_path()
-    total_price, total_cards = update_excel(file_path)
 
-    if total_price is not None and total_cards is not None:
-        send_discord_message(total_price, total_cards)
+    if SCHEDULER_MODE == "incremental":
+        refresh_due_cards(file_path)
+    else:
+        from discordNotifier import send_discord_message
+
+        total_price, total_cards = update_excel(file_path)
+
+        if total_price is not None and total_cards is not None:
+            send_discord_message(total_price, total_cards)
+
+    schedule_jobs()
 
     # Start monitoring the next run time
     display_next_run()
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import threading
+from utils import log
+
+# Per-stage metrics are only collected when METRICS_ENABLED is set; otherwise every hook is a no-op
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+METRICS_TEXTFILE_PATH = os.getenv("METRICS_TEXTFILE_PATH", "pkcscraper.prom")  # Prometheus node_exporter textfile
+METRICS_SUMMARY_PATH = os.getenv("METRICS_SUMMARY_PATH", "metrics_summary.json")
+METRICS_PREFIX = "pkcscraper"
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+class _Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bucket bound containing the q-th quantile (what Prometheus would report)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+def inc(name, amount=1):
+    """Adds to a counter."""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def observe(name, seconds):
+    """Records one duration in a histogram."""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = _Histogram()
+        histogram.observe(seconds)
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+_NULL_TIMER = _NullTimer()
+
+def timer(name):
+    """Context manager that records the block's duration; a shared no-op when metrics are off."""
+    return _Timer(name) if METRICS_ENABLED else _NULL_TIMER
+
+def reset():
+    """Clears all metrics at the start of a run."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def snapshot():
+    """Returns counters and histogram summaries as plain dicts."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {
+                name: {
+                    "count": h.count,
+                    "sum_seconds": round(h.sum, 6),
+                    "mean_seconds": round(h.sum / h.count, 6) if h.count else None,
+                    "p50_seconds": h.quantile(0.5),
+                    "p99_seconds": h.quantile(0.99),
+                    "max_seconds": round(h.max, 6),
+                }
+                for name, h in _histograms.items()
+            },
+        }
+
+def _write_atomic(path, content):
+    # The textfile collector may read at any moment, so never expose a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def write_prometheus_textfile(path=None):
+    """Writes counters and histograms in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+        for name, h in sorted(_histograms.items()):
+            metric = f"{METRICS_PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.bucket_counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [
+                f'{metric}_bucket{{le="+Inf"}} {h.count}',
+                f"{metric}_sum {h.sum}",
+                f"{metric}_count {h.count}",
+            ]
+    _write_atomic(path or METRICS_TEXTFILE_PATH, "\n".join(lines) + "\n")
+
+def write_run_summary(path=None, extra=None):
+    """Writes the run's metrics snapshot (plus any extra fields) as JSON."""
+    summary = {"finished_at": time.strftime("%Y-%m-%d %H:%M:%S"), **(extra or {}), **snapshot()}
+    _write_atomic(path or METRICS_SUMMARY_PATH, json.dumps(summary, indent=2, default=str))
+
+def export_run_metrics(extra=None):
+    """Writes both the Prometheus textfile and the JSON summary, if metrics are enabled."""
+    if not METRICS_ENABLED:
+        return
+    try:
+        write_prometheus_textfile()
+        write_run_summary(extra=extra)
+        log(f"Metrics written to {METRICS_TEXTFILE_PATH} and {METRICS_SUMMARY_PATH}")
+    except OSError as e:
+        log(f"Error writing metrics: {e}")
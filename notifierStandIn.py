@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAND_IN_TEMPLATE = "Stand-in says: {count} cards worth {value}."
+
+class _StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms, rate_429):
+        super().__init__(address, _StandInHandler)
+        self.latency_ms = latency_ms
+        self.rate_429 = rate_429
+        self.webhooks = []
+        self.completions = 0
+        self.lock = threading.Lock()
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Fakes a Discord webhook (any path) and OpenAI's /v1/chat/completions, with injected latency and 429s."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if server.latency_ms:
+            time.sleep(random.uniform(0.5, 1.5) * server.latency_ms / 1000)
+
+        if self.path.endswith("/chat/completions"):
+            with server.lock:
+                server.completions += 1
+            body = json.dumps({
+                "id": "chatcmpl-standin",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "stand-in"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": STAND_IN_TEMPLATE},
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode("utf-8")
+            status, headers = 200, {"Content-Type": "application/json"}
+        elif random.random() < server.rate_429:
+            status, body, headers = 429, b"", {"Retry-After": "0.2"}
+        else:
+            with server.lock:
+                server.webhooks.append(payload)
+            status, body, headers = 204, b"", {}
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in(latency_ms=0, rate_429=0.0):
+    """Starts the local webhook/LLM stand-in on a free port and returns (server, base_url)."""
+    server = _StandInServer(("127.0.0.1", 0), latency_ms, rate_429)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sends notifications through discordNotifier to a local webhook/LLM stand-in.")
+    parser.add_argument("--messages", type=int, default=5, help="Summary notifications to queue")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean stand-in latency per request")
+    parser.add_argument("--rate-429", type=float, default=0.3, help="Fraction of webhook posts answered with 429")
+    args = parser.parse_args()
+
+    server, base_url = start_stand_in(args.latency_ms, args.rate_429)
+
+    # The notifier reads its endpoints at import time, so point it at the stand-in first
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stand-in")
+    os.environ["DISCORD_WEBHOOK_URL"] = f"{base_url}/webhook"
+    os.environ["MESSAGE_CACHE_PATH"] = ""
+    import discordNotifier
+
+    discordNotifier.fetch_top_5_expensive_cards = lambda: [("Charizard", "Base Set", 350.0)]  # No database needed
+
+    start = time.perf_counter()
+    for i in range(args.messages):
+        discordNotifier.send_discord_message(1000.0 + i, 100 + i)
+    queued_ms = (time.perf_counter() - start) * 1000
+
+    delivered = discordNotifier.flush_notifications()
+    print(f"queued {args.messages} notifications in {queued_ms:.1f} ms; "
+          f"delivered={delivered} webhooks={len(server.webhooks)} completions={server.completions} "
+          f"in {time.perf_counter() - start:.2f}s")
+    if server.webhooks:
+        print(json.dumps(server.webhooks[0]["embeds"][0]["description"]))
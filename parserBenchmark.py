@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import hashlib
+import statistics
+from htmlExtractor import EXTRACTORS
+
+# Directory of saved PriceCharting product pages (*.html) used as the extractor correctness corpus.
+# The committed corpus holds trimmed pages covering the layouts the fast path must get right or defer on.
+EXTRACTOR_CORPUS_DIR = os.getenv("EXTRACTOR_CORPUS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "extractor_corpus"))
+REPEATS = int(os.getenv("EXTRACTOR_BENCH_REPEATS", "20"))
+
+def save_pages(urls, corpus_dir=EXTRACTOR_CORPUS_DIR):
+    """Downloads product pages into the corpus directory so they can be replayed offline."""
+    import requests
+    from dataFetcher import HEADERS
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    for url in urls:
+        response = requests.get(url, headers=HEADERS, timeout=10)
+        if response.status_code != 200:
+            print(f"Skipped {url}: HTTP {response.status_code}")
+            continue
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + ".html"
+        with open(os.path.join(corpus_dir, name), "w", encoding="utf-8") as f:
+            f.write(response.text)
+        print(f"Saved {url} -> {name}")
+
+def time_extractor(extractor, html, repeats=REPEATS):
+    """Returns the median parse time in milliseconds over several runs."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        extractor(html)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def run_benchmark(corpus_dir=EXTRACTOR_CORPUS_DIR):
+    """Checks every backend against BeautifulSoup on each saved page and prints per-page parse times."""
+    if not os.path.isdir(corpus_dir):
+        print(f"Corpus directory {corpus_dir} not found; set EXTRACTOR_CORPUS_DIR or save pages with --save URL ...")
+        return False
+
+    pages = sorted(f for f in os.listdir(corpus_dir) if f.endswith(".html"))
+    if not pages:
+        print(f"No .html pages found in {corpus_dir}.")
+        return False
+
+    mismatches = 0
+    totals = {name: 0.0 for name in EXTRACTORS}
+    print(f"{'page':<30}" + "".join(f"{name + ' (ms)':>14}" for name in EXTRACTORS) + "  result")
+
+    for page in pages:
+        with open(os.path.join(corpus_dir, page), encoding="utf-8") as f:
+            html = f.read()
+
+        expected = EXTRACTORS["bs4"](html)
+        row = f"{page:<30}"
+        status = "ok"
+        for name, extractor in EXTRACTORS.items():
+            result = extractor(html)
+            # None means the fast path defers to bs4, which is correct by definition
+            if result is not None and result != expected:
+                status = f"MISMATCH {name}: {result!r} != {expected!r}"
+                mismatches += 1
+            elapsed = time_extractor(extractor, html)
+            totals[name] += elapsed
+            row += f"{elapsed:>14.3f}"
+        print(f"{row}  {status}")
+
+    print(f"{'mean':<30}" + "".join(f"{totals[name] / len(pages):>14.3f}" for name in EXTRACTORS))
+    print(f"{len(pages)} pages, {mismatches} mismatches.")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    # Usage: python parserBenchmark.py [--save URL ...]
+    if len(sys.argv) > 1 and sys.argv[1] == "--save":
+        save_pages(sys.argv[2:])
+    else:
+        sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+
+# Results are written here as <timestamp>.json so runs can be compared
+BENCH_RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", "bench_results")
+
+FIXTURE_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>Card {card_id} Prices</title></head>
+<body>
+<div id="header">{padding}</div>
+<h1 id="product_name" class="chart_title">
+    Benchmark Card #{card_id}
+    <a href="/console/benchmark-set-{set_id}">Benchmark Set {set_id}</a>
+</h1>
+<table id="price_data"><tr>
+<td id="used_price"><span class="price js-price">
+    ${price:,.2f}
+</span></td>
+</tr></table>
+<div id="footer">{padding}</div>
+</body></html>
+"""
+
+class _FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms, rate_429, error_rate, page_kb):
+        super().__init__(address, _FixtureHandler)
+        self.latency_ms = latency_ms
+        self.rate_429 = rate_429
+        self.error_rate = error_rate
+        self.padding = "<p>" + "x" * max(0, page_kb * 512 - 7) + "</p>"
+        self.status_counts = {}
+        self.lock = threading.Lock()
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """Serves synthetic PriceCharting product pages with injected latency, 429s and 500s."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real site
+
+    def do_GET(self):
+        server = self.server
+        if server.latency_ms:
+            time.sleep(random.uniform(0.5, 1.5) * server.latency_ms / 1000)
+
+        roll = random.random()
+        if roll < server.rate_429:
+            status, body, headers = 429, b"", {"Retry-After": "1"}
+        elif roll < server.rate_429 + server.error_rate:
+            status, body, headers = 500, b"", {}
+        else:
+            card_id = int(self.path.rstrip("/").rsplit("-", 1)[-1])
+            status, headers = 200, {"Content-Type": "text/html; charset=utf-8"}
+            body = FIXTURE_TEMPLATE.format(
+                card_id=card_id,
+                set_id=card_id % 50,
+                price=(card_id % 9973) / 7 + 0.99,
+                padding=server.padding,
+            ).encode("utf-8")
+
+        with server.lock:
+            server.status_counts[status] = server.status_counts.get(status, 0) + 1
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+def start_fixture_server(latency_ms, rate_429, error_rate, page_kb):
+    """Starts the local PriceCharting stand-in on a free port and returns (server, base_url)."""
+    server = _FixtureServer(("127.0.0.1", 0), latency_ms, rate_429, error_rate, page_kb)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class _RoundTripCounter:
+    """Counts statements sent to the database by any SQLAlchemy engine."""
+
+    def __init__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+def _timed_map(func, items, workers):
+    """Runs func over items on a thread pool and returns per-item latencies in seconds."""
+    def timed(item):
+        start = time.perf_counter()
+        func(item)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(timed, items))
+
+def _stage_result(name, cards, elapsed, latencies=None, round_trips=None):
+    result = {
+        "stage": name,
+        "cards": cards,
+        "seconds": round(elapsed, 3),
+        "cards_per_sec": round(cards / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if latencies:
+        result["p50_ms"] = round(percentile(latencies, 50) * 1000, 2)
+        result["p99_ms"] = round(percentile(latencies, 99) * 1000, 2)
+    if round_trips is not None:
+        result["db_round_trips"] = round_trips
+    print(f"  {name:<14} {result['cards_per_sec']:>10} cards/s  "
+          f"p50={result.get('p50_ms', '-')}ms p99={result.get('p99_ms', '-')}ms  rss={result['peak_rss_mb']}MB"
+          + (f"  db={round_trips}" if round_trips is not None else ""))
+    return result
+
+def bench_parse(size):
+    from dataFetcher import parse_card_details
+
+    html = FIXTURE_TEMPLATE.format(card_id=1, set_id=1, price=12.34, padding="<p>" + "x" * 30000 + "</p>")
+    start = time.perf_counter()
+    latencies = _timed_map(lambda _: parse_card_details(html), range(size), workers=1)
+    return _stage_result("parse", size, time.perf_counter() - start, latencies)
+
+def bench_fetch(links, workers):
+    from dataFetcher import fetch_card_data
+
+    start = time.perf_counter()
+    latencies = _timed_map(lambda item: fetch_card_data(item[1], item[0]), list(enumerate(links)), workers)
+    return _stage_result("fetch", len(links), time.perf_counter() - start, latencies)
+
+def bench_store(links, counter):
+    from dataStorage import store_data_in_db, BatchedCardWriter
+
+    results = []
+    sample = links[:min(len(links), 2000)]  # Per-row writes are slow; a sample is enough for the rate
+    before = counter.count
+    start = time.perf_counter()
+    latencies = _timed_map(lambda link: store_data_in_db("Benchmark Card", "Benchmark Set", 1.0, link), sample, workers=1)
+    results.append(_stage_result("store_per_row", len(sample), time.perf_counter() - start, latencies, counter.count - before))
+
+    before = counter.count
+    start = time.perf_counter()
+    with BatchedCardWriter() as writer:
+        for i, link in enumerate(links):
+            writer.submit("Benchmark Card", "Benchmark Set", 2.0 + i % 7, link)
+    results.append(_stage_result("store_batched", len(links), time.perf_counter() - start, round_trips=counter.count - before))
+    return results
+
+def bench_export(size, counter, workdir):
+    import excelExport
+
+    before = counter.count
+    start = time.perf_counter()
+    excelExport.export_to_excel(os.path.join(workdir, "bench_export.xlsx"))
+    return _stage_result("export", size, time.perf_counter() - start, round_trips=counter.count - before)
+
+def bench_update_excel(links, counter, workdir):
+    import pandas as pd
+
+    workbook = os.path.join(workdir, "bench_cards.xlsx")
+    pd.DataFrame({
+        "Card Title": [""] * len(links),
+        "Set": [""] * len(links),
+        "Link": links,
+        "Ungraded Price": [None] * len(links),
+    }).to_excel(workbook, index=False)
+
+    import main
+
+    before = counter.count
+    start = time.perf_counter()
+    main.update_excel(workbook)
+    return _stage_result("update_excel", len(links), time.perf_counter() - start, round_trips=counter.count - before)
+
+def cleanup_benchmark_rows(base_url):
+    """Removes rows the benchmark wrote so a shared database isn't polluted."""
+    from sqlalchemy import text
+    from dbManager import get_db_engine
+
+    with get_db_engine().begin() as conn:
+        for table in ("cards", "price_history", "refresh_schedule"):
+            conn.execute(text(f"DELETE FROM card_inventory.{table} WHERE link LIKE :prefix"), {"prefix": f"{base_url}/%"})
+
+def run_benchmark(args):
+    # Point the scraper at the stand-in and lift limits meant for the real site, before any project import
+    server, base_url = start_fixture_server(args.latency_ms, args.rate_429, args.error_rate, args.page_kb)
+    os.environ["PRICECHARTING_HOST"] = base_url.split("//", 1)[1]
+    os.environ.setdefault("RESPONSE_CACHE_PATH", "")
+    os.environ.setdefault("RATE_INITIAL", "1000")
+    os.environ.setdefault("RATE_MAX", "5000")
+    os.environ.setdefault("RATE_BURST", "100")
+
+    workdir = tempfile.mkdtemp(prefix="pkcbench_")
+    os.environ["EXPORT_PATH"] = os.path.join(workdir, "bench_export.xlsx")
+
+    counter = None
+    if args.with_db:
+        from dbManager import ensure_db_initialized
+        ensure_db_initialized()
+        counter = _RoundTripCounter()
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "runs": [],
+    }
+
+    try:
+        for size in args.sizes:
+            print(f"\n== {size} cards ==")
+            links = [f"{base_url}/game/benchmark-set/benchmark-card-{i}" for i in range(size)]
+            server.status_counts.clear()
+            stages = [bench_parse(size), bench_fetch(links, args.workers)]
+
+            if args.with_db:
+                stages.extend(bench_store(links, counter))
+                stages.append(bench_export(size, counter, workdir))
+                if size <= args.max_pipeline_size:
+                    stages.append(bench_update_excel(links, counter, workdir))
+                cleanup_benchmark_rows(base_url)
+
+            report["runs"].append({
+                "size": size,
+                "stages": stages,
+                "server_status_counts": dict(server.status_counts),
+            })
+    finally:
+        server.shutdown()
+
+    os.makedirs(BENCH_RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(BENCH_RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nResults saved to {output}")
+    return output
+
+def compare_results(baseline_path, current_path, threshold=0.10):
+    """Prints per-stage throughput deltas between two result files; returns False on any regression."""
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return {(run["size"], stage["stage"]): stage for run in data["runs"] for stage in run["stages"]}
+
+    baseline, current = load(baseline_path), load(current_path)
+    ok = True
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key]["cards_per_sec"], current[key]["cards_per_sec"]
+        if not old or not new:
+            continue
+        delta = (new - old) / old
+        flag = "REGRESSION" if delta < -threshold else ""
+        ok = ok and not flag
+        print(f"{key[0]:>7} {key[1]:<14} {old:>10} -> {new:>10} cards/s ({delta:+.1%}) {flag}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end scraper benchmark against a local PriceCharting stand-in.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--workers", type=int, default=10, help="Fetch threads for the fetch stage")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean server latency per request")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--page-kb", type=int, default=60, help="Approximate fixture page size")
+    parser.add_argument("--with-db", action="store_true",
+                        help="Also benchmark DB stages and update_excel (uses DB_* env; point it at a throwaway Postgres)")
+    parser.add_argument("--max-pipeline-size", type=int, default=10000, help="Largest size to run full update_excel at")
+    parser.add_argument("--output", help="Result JSON path (default: bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare_results(*args.compare) else 1)
+    run_benchmark(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+from utils import log
+import metrics
+
+# Alert rules live in a CSV with columns scope,target,kind,threshold:
+#   scope  card (target = card link), set (target = set name) or all (target left empty)
+#   kind   above / below (price crosses threshold), change_pct (move of at least threshold %, negative for drops)
+#          or all_time_high (threshold ignored)
+PRICE_ALERT_RULES = os.getenv("PRICE_ALERT_RULES", "")
+PRICE_ALERT_COOLDOWN_HOURS = float(os.getenv("PRICE_ALERT_COOLDOWN_HOURS", "24"))  # Same rule + card stays quiet this long
+PRICE_ALERT_WEBHOOK_URL = os.getenv("PRICE_ALERT_WEBHOOK_URL") or os.getenv("DISCORD_WEBHOOK_URL")
+
+RULE_SCOPES = ("card", "set", "all")
+RULE_KINDS = ("above", "below", "change_pct", "all_time_high")
+
+# Discord caps an embed description at 4096 characters, a message at 10 embeds and 6000 characters in total
+EMBED_DESCRIPTION_CHARS = 4000
+MESSAGE_CHARS = 5800
+EMBEDS_PER_MESSAGE = 10
+
+def load_rules(path=None):
+    """Reads the rules CSV into a DataFrame with a stable rule_key per rule; invalid rows are logged and dropped."""
+    import pandas as pd
+    from dataSanitizer import canonicalize_link
+
+    rules = pd.read_csv(path or PRICE_ALERT_RULES, dtype=str, keep_default_na=False)
+    rules["scope"] = rules["scope"].str.strip().str.lower()
+    rules["kind"] = rules["kind"].str.strip().str.lower()
+    rules["target"] = rules["target"].str.strip()
+    rules["threshold"] = pd.to_numeric(rules["threshold"], errors="coerce")
+
+    card_rules = rules["scope"] == "card"
+    rules.loc[card_rules, "target"] = rules.loc[card_rules, "target"].map(canonicalize_link)
+
+    invalid = ~rules["scope"].isin(RULE_SCOPES) | ~rules["kind"].isin(RULE_KINDS) | \
+        (rules["threshold"].isna() & (rules["kind"] != "all_time_high"))
+    if invalid.any():
+        log(f"Ignoring {int(invalid.sum())} invalid price alert rules.")
+        rules = rules[~invalid]
+
+    thresholds = rules["threshold"].map(lambda threshold: "" if pd.isna(threshold) else f"{threshold:g}")
+    rules = rules.assign(rule_key=rules["scope"] + ":" + rules["target"] + ":" + rules["kind"] + ":" + thresholds)
+    return rules.drop_duplicates("rule_key")
+
+def snapshot(df):
+    """Collapses a workbook DataFrame to one row per canonical link with card_title, card_set and numeric price."""
+    import pandas as pd
+    from dataSanitizer import canonicalize_link, normalize_prices
+
+    links = df["Link"].dropna()
+    return pd.DataFrame({
+        "link": links.astype(str).map(canonicalize_link),
+        "card_title": df.loc[links.index, "Card Title"],
+        "card_set": df.loc[links.index, "Set"],
+        "price": normalize_prices(df.loc[links.index, "Ungraded Price"]),
+    }).drop_duplicates("link").set_index("link")
+
+def evaluate_rules(previous, current, rules, highs=None):
+    """
+    Evaluates every rule against every card it covers in one vectorized pass. The snapshots are joined on
+    link, rules are expanded to their cards with merges (by link, by set, or a cross join for "all"), and the
+    firing conditions are whole-column comparisons. Returns the fired (rule, card) rows.
+    """
+    import numpy as np
+    import pandas as pd
+
+    cards = current.rename(columns={"price": "new_price"}).join(previous["price"].rename("old_price"), how="left")
+    cards["previous_high"] = highs.reindex(cards.index) if highs is not None else np.nan
+    cards = cards.reset_index()
+
+    candidates = pd.concat([
+        rules[rules["scope"] == "card"].merge(cards, left_on="target", right_on="link"),
+        rules[rules["scope"] == "set"].merge(cards, left_on="target", right_on="card_set"),
+        rules[rules["scope"] == "all"].merge(cards, how="cross"),
+    ], ignore_index=True)
+    if candidates.empty:
+        return candidates
+
+    new, old, threshold, kind = candidates["new_price"], candidates["old_price"], candidates["threshold"], candidates["kind"]
+    change_pct = (new - old) / old.where(old > 0) * 100
+    candidates["change_pct"] = change_pct
+
+    # NaN compares false, so cards without a price never fire; a first price counts as crossing a threshold
+    fired = (
+        ((kind == "above") & (new >= threshold) & ~(old >= threshold))
+        | ((kind == "below") & (new <= threshold) & ~(old <= threshold))
+        | ((kind == "change_pct") & (((threshold >= 0) & (change_pct >= threshold)) | ((threshold < 0) & (change_pct <= threshold))))
+        | ((kind == "all_time_high") & (new > candidates["previous_high"]))
+    )
+    return candidates[fired].drop_duplicates(["rule_key", "link"])
+
+def filter_recently_sent(alerts, cooldown_hours=None):
+    """Drops alerts whose rule already fired for the same card within the cooldown (one query, then an anti-join)."""
+    import pandas as pd
+    from sqlalchemy import text
+    from dbManager import get_db_engine
+
+    query = text("""
+        SELECT rule_key, link
+        FROM card_inventory.sent_alerts
+        WHERE sent_at > NOW() - :hours * INTERVAL '1 hour'
+          AND rule_key = ANY(CAST(:rule_keys AS TEXT[]));
+    """)
+    with get_db_engine().connect() as conn:
+        recent = conn.execute(query, {
+            "hours": PRICE_ALERT_COOLDOWN_HOURS if cooldown_hours is None else cooldown_hours,
+            "rule_keys": alerts["rule_key"].unique().tolist(),
+        }).fetchall()
+    if not recent:
+        return alerts
+
+    sent = pd.DataFrame(recent, columns=["rule_key", "link"])
+    merged = alerts.merge(sent, on=["rule_key", "link"], how="left", indicator=True)
+    return merged[merged["_merge"] == "left_only"].drop(columns="_merge")
+
+def record_sent(alerts):
+    """Remembers the alerts just posted, for the cooldown check."""
+    from sqlalchemy import text
+    from dbManager import get_db_engine
+
+    query = text("""
+        INSERT INTO card_inventory.sent_alerts (rule_key, link, price, sent_at)
+        VALUES (:rule_key, :link, :price, NOW())
+        ON CONFLICT (rule_key, link) DO UPDATE SET price = EXCLUDED.price, sent_at = NOW();
+    """)
+    with get_db_engine().begin() as conn:
+        conn.execute(query, [
+            {"rule_key": rule_key, "link": link, "price": float(price)}
+            for rule_key, link, price in zip(alerts["rule_key"], alerts["link"], alerts["new_price"])
+        ])
+
+def format_alert(alert):
+    """One Markdown line describing a fired alert."""
+    old = f"${alert.old_price:,.2f}" if alert.old_price == alert.old_price else "new"  # NaN != NaN
+    line = f"[{alert.card_title}]({alert.link}) ({alert.card_set}): {old} → ${alert.new_price:,.2f}"
+    if alert.change_pct == alert.change_pct:
+        line += f" ({alert.change_pct:+.1f}%)"
+    if alert.kind == "all_time_high":
+        return f"{line} — new all-time high"
+    if alert.kind == "change_pct":
+        return f"{line} — {'dropped' if alert.threshold < 0 else 'rose'} at least {abs(alert.threshold):g}%"
+    return f"{line} — {alert.kind} ${alert.threshold:,.2f}"
+
+def build_payloads(lines):
+    """Packs alert lines into as few webhook payloads as Discord's embed and message limits allow."""
+    payloads, embeds, description, message_chars = [], [], "", 0
+
+    def close_embed():
+        nonlocal description, message_chars
+        if description:
+            embeds.append({"title": "🚨 Price Alerts", "description": description, "color": 0xe67e22})
+            message_chars += len(description)
+            description = ""
+
+    for line in lines:
+        line = line[:EMBED_DESCRIPTION_CHARS]
+        if len(description) + len(line) + 1 > EMBED_DESCRIPTION_CHARS:
+            close_embed()
+        if message_chars + len(description) + len(line) + 1 > MESSAGE_CHARS or len(embeds) == EMBEDS_PER_MESSAGE:
+            close_embed()
+            payloads.append({"embeds": embeds})
+            embeds, message_chars = [], 0
+        description += line + "\n"
+
+    close_embed()
+    if embeds:
+        payloads.append({"embeds": embeds})
+    return payloads
+
+def check_price_alerts(previous_df, current_df, since=None):
+    """
+    Evaluates the PRICE_ALERT_RULES between two workbook states and queues new alerts in batched messages.
+    since is the run's start time; all-time highs compare against history observed before it.
+    Returns the number of alerts sent.
+    """
+    if not PRICE_ALERT_RULES:
+        return 0
+
+    import pandas as pd
+
+    rules = load_rules()
+    highs = None
+    if since is not None and (rules["kind"] == "all_time_high").any():
+        from dataStorage import get_price_highs
+        highs = pd.Series({link: float(high) for link, high in get_price_highs(since)}, dtype=float)
+
+    with metrics.timer("alerts"):
+        alerts = evaluate_rules(snapshot(previous_df), snapshot(current_df), rules, highs)
+        if not alerts.empty:
+            alerts = filter_recently_sent(alerts)
+    if alerts.empty:
+        log("No new price alerts.")
+        return 0
+
+    if not PRICE_ALERT_WEBHOOK_URL:
+        log(f"{len(alerts)} price alerts fired but no webhook URL is set.")
+        return 0
+
+    from discordNotifier import queue_webhook
+
+    # Delivery happens on the notifier thread; the cooldown is recorded now, so a failed post isn't repeated
+    payloads = build_payloads([format_alert(alert) for alert in alerts.itertuples(index=False)])
+    for payload in payloads:
+        queue_webhook(PRICE_ALERT_WEBHOOK_URL, payload, "Price alerts")
+    record_sent(alerts)
+    metrics.inc("alerts_sent", len(alerts))
+    log(f"Queued {len(alerts)} price alerts in {len(payloads)} messages.")
+    return len(alerts)
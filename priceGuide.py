@@ -0,0 +1,100 @@
+import os
+import argparse
+from utils import log
+import metrics
+
+# Bulk price-guide ingestion: set PRICE_GUIDE_SOURCE to a price-guide CSV path or URL (.csv or .csv.gz)
+# and update_excel takes every card it can match from the file, scraping only the rest
+PRICE_GUIDE_SOURCE = os.getenv("PRICE_GUIDE_SOURCE", "")
+PRICE_GUIDE_CHUNK_ROWS = int(os.getenv("PRICE_GUIDE_CHUNK_ROWS", "50000"))
+PRICE_GUIDE_PRICE_COLUMN = os.getenv("PRICE_GUIDE_PRICE_COLUMN", "loose-price")  # Ungraded price in PriceCharting's guide
+
+PRODUCT_URL_PREFIX = "https://www.pricecharting.com/game/"
+
+# Columns read from the guide; anything else in the file is skipped while parsing
+GUIDE_COLUMNS = ("id", "console-name", "product-name", "url")
+
+def slugify(values):
+    """Vectorized PriceCharting slug: 'Charizard #4' -> 'charizard-4'."""
+    return (values.fillna("").str.lower()
+            .str.replace(r"[^a-z0-9\s-]", "", regex=True)
+            .str.strip()
+            .str.replace(r"[\s-]+", "-", regex=True))
+
+def normalize_product_id(product_id):
+    """Product IDs read from Excel come back as floats (12345.0); the guide has them as text."""
+    if isinstance(product_id, float) and product_id.is_integer():
+        return str(int(product_id))
+    return str(product_id).strip()
+
+def read_price_guide(source, chunk_rows=None, price_column=None):
+    """Streams the guide in chunks of [id, console-name, product-name, url, price] rows, all as strings."""
+    import pandas as pd
+
+    price_column = price_column or PRICE_GUIDE_PRICE_COLUMN
+    wanted = set(GUIDE_COLUMNS) | {price_column}
+    return pd.read_csv(
+        source,
+        chunksize=chunk_rows or PRICE_GUIDE_CHUNK_ROWS,
+        usecols=lambda col: col in wanted,
+        dtype=str,
+        keep_default_na=False,
+    )
+
+def _chunk_links(chunk, link_by_id):
+    """Canonical link for each guide row: product ID first, then the row's URL or one built from its names."""
+    from dataSanitizer import canonicalize_link
+
+    links = chunk["id"].map(link_by_id) if link_by_id and "id" in chunk else None
+    if "url" in chunk:
+        by_url = chunk["url"].map(canonicalize_link)
+    else:
+        by_url = PRODUCT_URL_PREFIX + slugify(chunk["console-name"]) + "/" + slugify(chunk["product-name"])
+    return by_url if links is None else links.fillna(by_url)
+
+def ingest_price_guide(links, source=None, product_ids=None, price_column=None):
+    """
+    Hash-joins the price guide against our canonical links and returns {link: (title, set, price)} for every
+    card found with a price. Rows with a blank price are left out, so those cards are still scraped.
+    product_ids optionally maps link -> PriceCharting product ID for an exact ID join.
+    """
+    from dataSanitizer import normalize_prices
+
+    source = source or PRICE_GUIDE_SOURCE
+    price_column = price_column or PRICE_GUIDE_PRICE_COLUMN
+    wanted = set(links)
+    link_by_id = {normalize_product_id(product_id): link for link, product_id in (product_ids or {}).items() if link in wanted}
+    matched = {}
+    rows_read = 0
+
+    with metrics.timer("price_guide"):
+        for chunk in read_price_guide(source, price_column=price_column):
+            rows_read += len(chunk)
+            chunk = chunk.assign(link=_chunk_links(chunk, link_by_id))
+            chunk = chunk[chunk["link"].isin(wanted)]
+            if chunk.empty:
+                continue
+
+            prices = normalize_prices(chunk[price_column])
+            priced = prices.notna()
+            chunk, prices = chunk[priced], prices[priced]
+            for link, card_title, card_set, price in zip(chunk["link"], chunk["product-name"], chunk["console-name"], prices):
+                matched[link] = (card_title or None, card_set or None, float(price))
+
+    metrics.inc("price_guide_matches", len(matched))
+    log(f"Price guide: matched {len(matched)} of {len(wanted)} cards from {rows_read} guide rows.")
+    return matched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dry run: reports how many workbook cards a price-guide CSV covers.")
+    parser.add_argument("source", help="Price-guide CSV path or URL")
+    parser.add_argument("workbook", help="Card workbook (.xlsx)")
+    args = parser.parse_args()
+
+    from inputCache import read_workbook
+    from dataSanitizer import canonicalize_link
+
+    workbook_links = {canonicalize_link(str(link)) for link in read_workbook(args.workbook)["Link"].dropna()}
+    found = ingest_price_guide(workbook_links, source=args.source)
+    for link in sorted(workbook_links - found.keys())[:20]:
+        print(f"unmatched: {link}")
@@ -0,0 +1,74 @@
+import sys
+import json
+import time
+import threading
+from utils import PROGRESS_MODE
+
+# Redraw interval in seconds (JSON lines are emitted less often to keep unattended logs small)
+PROGRESS_INTERVAL = 10.0 if PROGRESS_MODE == "json" else 0.5
+
+class ProgressReporter:
+    """
+    Single progress display for a run. Workers call advance(), which only bumps a counter under a lock;
+    a background thread redraws at a fixed rate so stdout is written from one place only.
+    """
+
+    def __init__(self, total, label="Progress", interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.completed = 0
+        self._lock = threading.Lock()  # A bare += from many threads can lose or reorder updates
+        self._start = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the redraw thread (not started in quiet mode)."""
+        if PROGRESS_MODE != "quiet":
+            self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+            self._thread.start()
+        return self
+
+    def advance(self):
+        """Marks one more item as done."""
+        with self._lock:
+            self.completed += 1
+
+    def close(self):
+        """Stops redrawing and prints the final state."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._draw(final=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._draw()
+
+    def _draw(self, final=False):
+        completed = self.completed
+        elapsed = time.monotonic() - self._start
+        percent = completed / self.total * 100 if self.total else 100.0
+        rate = completed / elapsed if elapsed else 0.0
+
+        if PROGRESS_MODE == "json":
+            sys.stdout.write(json.dumps({
+                "event": "progress",
+                "label": self.label,
+                "completed": completed,
+                "total": self.total,
+                "percent": round(percent, 2),
+                "per_second": round(rate, 2),
+            }) + "\n")
+        else:
+            sys.stdout.write(f"\r[{self.label}] {percent:.2f}% ({completed}/{self.total}) {rate:.1f}/s   ")
+            if final:
+                sys.stdout.write("\n")
+        sys.stdout.flush()
@@ -0,0 +1,239 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from utils import log
+
+# AIMD rate controller settings (requests per second, per host)
+RATE_INITIAL = float(os.getenv("RATE_INITIAL", "5"))
+RATE_MIN = float(os.getenv("RATE_MIN", "0.2"))
+RATE_MAX = float(os.getenv("RATE_MAX", "50"))
+RATE_BURST = float(os.getenv("RATE_BURST", "5"))
+RATE_INCREASE = float(os.getenv("RATE_INCREASE", "0.05"))  # Added to the rate on every success
+RATE_DECREASE = float(os.getenv("RATE_DECREASE", "0.5"))   # Rate multiplier on 429/5xx
+RATE_DECREASE_COOLDOWN = 1.0  # One throttling burst only cuts the rate once
+
+# Circuit breaker: when most recent requests to a host fail (5xx or connection errors), every fetch to it
+# pauses for a cooldown instead of each worker retrying into the outage; then one probe request decides
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))  # Recent outcomes considered
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))  # Seconds; doubles while probes keep failing
+BREAKER_MAX_COOLDOWN = float(os.getenv("BREAKER_MAX_COOLDOWN", "600"))
+BREAKER_PROBE_POLL = 0.5  # How often callers check back while the probe is in flight
+
+def parse_retry_after(value):
+    """Parses a Retry-After header (delta seconds or HTTP date) into seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class HostRateLimiter:
+    """Token bucket for one host whose refill rate adapts with additive increase / multiplicative decrease."""
+
+    def __init__(self, host):
+        self.host = host
+        self.rate = RATE_INITIAL
+        self.tokens = RATE_BURST
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.wait_seconds = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token and returns how long the caller must wait before sending its request."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(RATE_BURST, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # Negative balance queues callers behind each other
+            wait = max(self.paused_until - now, 0.0) + max(-self.tokens / self.rate, 0.0)
+            self.wait_seconds += wait
+            self.requests += 1
+            return wait
+
+    def record(self, status_code, retry_after=None):
+        """Feeds a response back: successes raise the rate, 429/5xx cut it and honour Retry-After."""
+        with self._lock:
+            now = time.monotonic()
+            if status_code == 429 or status_code >= 500:
+                self.throttled += 1
+                if now - self.last_decrease >= RATE_DECREASE_COOLDOWN:
+                    self.rate = max(RATE_MIN, self.rate * RATE_DECREASE)
+                    self.last_decrease = now
+                    log(f"Throttled by {self.host} (HTTP {status_code}). Rate lowered to {self.rate:.2f} req/s.")
+
+                if status_code == 429:
+                    delay = parse_retry_after(retry_after)
+                    if delay is None:
+                        delay = random.uniform(5, 10)
+                    self.paused_until = max(self.paused_until, now + delay)
+                    self.tokens = min(self.tokens, 0.0)
+            else:
+                self.rate = min(RATE_MAX, self.rate + RATE_INCREASE)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
+
+class HostCircuitBreaker:
+    """Closed / open / half-open breaker for one host, tripped by the error rate over a sliding window."""
+
+    def __init__(self, host):
+        self.host = host
+        self.state = "closed"
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)
+        self.cooldown = BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self.probing = False
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """
+        Returns (wait, probe): wait is 0 if the caller may send a request now, otherwise how long to wait
+        before asking again; probe is True for the single caller let through to test a half-open circuit.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return 0.0, False
+            now = time.monotonic()
+            if self.state == "open":
+                if now < self.open_until:
+                    return self.open_until - now, False
+                self.state = "half-open"
+            if self.probing:
+                return BREAKER_PROBE_POLL, False
+            self.probing = True  # This caller is the probe
+            return 0.0, True
+
+    def release_probe(self):
+        """Hands the probe slot back when the probe ended without a verdict (429, or an unexpected exception)."""
+        with self._lock:
+            self.probing = False
+
+    def record(self, failed):
+        """Feeds back one request outcome; a failure is a 5xx or a connection error."""
+        with self._lock:
+            if self.state == "half-open":
+                self.probing = False
+                if failed:
+                    self.cooldown = min(BREAKER_MAX_COOLDOWN, self.cooldown * 2)
+                    self._open(f"probe failed, pausing {self.cooldown:.0f}s")
+                else:
+                    self.state = "closed"
+                    self.cooldown = BREAKER_COOLDOWN
+                    self.outcomes.clear()
+                    log(f"Circuit breaker for {self.host} closed; resuming fetches.")
+                return
+            if self.state == "open":
+                return  # Late results from requests sent before the trip
+
+            self.outcomes.append(failed)
+            if len(self.outcomes) >= BREAKER_MIN_REQUESTS and sum(self.outcomes) / len(self.outcomes) >= BREAKER_ERROR_RATE:
+                self.trips += 1
+                self._open(f"{sum(self.outcomes)} of the last {len(self.outcomes)} requests failed, pausing {self.cooldown:.0f}s")
+
+    def _open(self, reason):
+        self.state = "open"
+        self.open_until = time.monotonic() + self.cooldown
+        log(f"Circuit breaker for {self.host} open: {reason}.")
+
+_limiters = {}
+_breakers = {}
+_limiters_lock = threading.Lock()
+
+def get_host_limiter(url):
+    """Returns the process-wide limiter for the URL's host."""
+    host = urlparse(url).netloc
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = HostRateLimiter(host)
+    return limiter
+
+def get_host_breaker(url):
+    """Returns the process-wide circuit breaker for the URL's host."""
+    host = urlparse(url).netloc
+    with _limiters_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = HostCircuitBreaker(host)
+    return breaker
+
+def wait_for_slot(url):
+    """
+    Blocks the calling thread while the host's circuit is open, then until its bucket allows another request.
+    Returns True if the caller is the half-open probe; it must then call release_probe once its request is over.
+    """
+    breaker = get_host_breaker(url)
+    pause, probe = breaker.admit()
+    while pause > 0:
+        time.sleep(pause)
+        pause, probe = breaker.admit()
+
+    wait = get_host_limiter(url).reserve()
+    if wait > 0:
+        time.sleep(wait)
+    return probe
+
+async def wait_for_slot_async(url):
+    """Asyncio counterpart of wait_for_slot."""
+    import asyncio
+
+    breaker = get_host_breaker(url)
+    pause, probe = breaker.admit()
+    while pause > 0:
+        await asyncio.sleep(pause)
+        pause, probe = breaker.admit()
+
+    wait = get_host_limiter(url).reserve()
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return probe
+
+def record_response(url, status_code, retry_after=None):
+    """Reports a response status (and Retry-After header, if any) to the host's limiter and circuit breaker."""
+    get_host_limiter(url).record(status_code, retry_after)
+    if status_code == 429:
+        get_host_breaker(url).release_probe()  # Throttling is the limiter's business, not an outage: stay half-open
+    else:
+        get_host_breaker(url).record(status_code >= 500)
+
+def record_request_error(url):
+    """Reports a request that got no response at all (timeout, connection error) to the host's circuit breaker."""
+    get_host_breaker(url).record(True)
+
+def release_probe(url):
+    """Frees the host's probe slot; call it in a finally after a request for which wait_for_slot returned True."""
+    get_host_breaker(url).release_probe()
+
+def get_rate_stats():
+    """Returns current rate, request count, throttle count, waiting time and circuit breaker trips for every host."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+        breakers = dict(_breakers)
+    return {
+        limiter.host: {**limiter.stats(), "breaker_trips": breakers[limiter.host].trips if limiter.host in breakers else 0}
+        for limiter in limiters
+    }
@@ -0,0 +1,91 @@
+import os
+import math
+from sqlalchemy import text
+from dbManager import get_db_engine
+from utils import log
+
+# Incremental refresh settings
+REFRESH_TICK_MINUTES = int(os.getenv("REFRESH_TICK_MINUTES", "15"))
+REFRESH_BUDGET_PER_TICK = int(os.getenv("REFRESH_BUDGET_PER_TICK", "250"))  # Max cards fetched per tick
+REFRESH_MIN_INTERVAL_HOURS = float(os.getenv("REFRESH_MIN_INTERVAL_HOURS", "4"))
+REFRESH_MAX_INTERVAL_HOURS = float(os.getenv("REFRESH_MAX_INTERVAL_HOURS", "168"))
+REFRESH_VALUE_WEIGHT = float(os.getenv("REFRESH_VALUE_WEIGHT", "1.0"))
+REFRESH_VOLATILITY_WEIGHT = float(os.getenv("REFRESH_VOLATILITY_WEIGHT", "50.0"))
+VOLATILITY_SMOOTHING = 0.3  # Weight of the newest price move in the volatility EWMA
+
+def register_links(links):
+    """Adds links that aren't scheduled yet; new cards are due immediately."""
+    query = text("""
+        INSERT INTO card_inventory.refresh_schedule (link, next_due)
+        SELECT link, NOW() FROM unnest(CAST(:links AS TEXT[])) AS link
+        ON CONFLICT (link) DO NOTHING;
+    """)
+    engine = get_db_engine()
+    with engine.begin() as conn:
+        conn.execute(query, {"links": list(links)})
+
+def get_due_links(budget=None, links=None):
+    """
+    Returns {link: volatility} for the most overdue cards, oldest due time first, capped at the tick budget.
+    If links is given, only those links are considered (cards removed from the workbook are ignored).
+    """
+    query = text("""
+        SELECT link, volatility
+        FROM card_inventory.refresh_schedule
+        WHERE next_due <= NOW()
+          AND (CAST(:links AS TEXT[]) IS NULL OR link = ANY(CAST(:links AS TEXT[])))
+        ORDER BY next_due
+        LIMIT :budget;
+    """)
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        rows = conn.execute(query, {
+            "budget": budget or REFRESH_BUDGET_PER_TICK,
+            "links": list(links) if links is not None else None,
+        }).fetchall()
+    return {link: volatility for link, volatility in rows}
+
+def refresh_interval(price, volatility):
+    """Hours until the next refresh: valuable and volatile cards come back sooner."""
+    value_score = math.log10(1 + price) if price else 0.0
+    urgency = 1 + REFRESH_VALUE_WEIGHT * value_score + REFRESH_VOLATILITY_WEIGHT * volatility
+    return min(REFRESH_MAX_INTERVAL_HOURS, max(REFRESH_MIN_INTERVAL_HOURS, REFRESH_MAX_INTERVAL_HOURS / urgency))
+
+def update_volatility(volatility, old_price, new_price):
+    """Folds the latest relative price move into the card's exponentially weighted volatility."""
+    if not old_price or new_price is None:
+        return volatility
+    move = abs(new_price - old_price) / old_price
+    return (1 - VOLATILITY_SMOOTHING) * volatility + VOLATILITY_SMOOTHING * move
+
+def record_refreshes(results, volatilities):
+    """
+    Stores the next due time for each refreshed card.
+    results is a list of (link, old_price, new_price); failed fetches are retried after the minimum interval.
+    """
+    rows = []
+    for link, old_price, new_price in results:
+        volatility = update_volatility(volatilities.get(link, 0.0), old_price, new_price)
+        if new_price is None:
+            hours = REFRESH_MIN_INTERVAL_HOURS
+        else:
+            hours = refresh_interval(new_price, volatility)
+        rows.append({
+            "link": link,
+            "seconds": hours * 3600,
+            "volatility": volatility,
+        })
+
+    if not rows:
+        return
+
+    query = text("""
+        INSERT INTO card_inventory.refresh_schedule (link, next_due, last_checked, volatility)
+        VALUES (:link, NOW() + :seconds * INTERVAL '1 second', NOW(), :volatility)
+        ON CONFLICT (link) DO UPDATE
+        SET next_due = EXCLUDED.next_due, last_checked = EXCLUDED.last_checked, volatility = EXCLUDED.volatility;
+    """)
+    engine = get_db_engine()
+    with engine.begin() as conn:
+        conn.execute(query, rows)
+    log(f"Rescheduled {len(rows)} cards.")
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from utils import log
+import metrics
+
+# Local cache of PriceCharting validators and extracted card details. Set RESPONSE_CACHE_PATH="" to disable.
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds before an entry is refetched in full
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Markers around the part of a product page we actually read
+PRICE_BLOCK_START = 'id="product_name"'
+PRICE_BLOCK_END = 'class="price js-price"'
+
+def price_block_hash(html):
+    """Hashes the title/price section of a product page without parsing it."""
+    start = html.find(PRICE_BLOCK_START)
+    end = html.find(PRICE_BLOCK_END, max(start, 0))
+    if start != -1 and end != -1:
+        close = html.find("</span>", end)
+        block = html[start:close if close != -1 else end]
+    else:
+        block = html  # Unknown layout, fall back to the whole page
+    return hashlib.sha256(block.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """SQLite-backed store of ETag/Last-Modified validators and parsed results, evicted LRU by size."""
+
+    def __init__(self, path, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                card_title TEXT,
+                card_set TEXT,
+                price TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def lookup(self, url):
+        """Returns the cached entry for url as a dict, or None if missing or older than the TTL."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, card_title, card_set, price, size, fetched_at "
+                "FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if time.time() - row[7] > self.ttl:
+                self._delete(url, row[6])
+                self._conn.commit()
+                return None
+
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "content_hash": row[2],
+            "result": (row[3], row[4], row[5]),
+        }
+
+    @staticmethod
+    def validator_headers(entry):
+        """Builds If-None-Match / If-Modified-Since headers for a cached entry."""
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def mark_unchanged(self, url, entry, etag=None, last_modified=None):
+        """
+        Records a 304 or same-hash response and returns the cached (title, set, price). fetched_at is left
+        alone, so the entry still expires after the TTL and the page is then fetched and parsed in full.
+        """
+        metrics.inc("cache_hits")
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), "
+                "last_access = ? WHERE url = ?",
+                (etag, last_modified, time.time(), url)
+            )
+            self._conn.commit()
+        return entry["result"]
+
+    def store(self, url, etag, last_modified, content_hash, result):
+        """Saves validators and the parsed (title, set, price) for url, evicting old entries if needed."""
+        card_title, card_set, price = result
+        size = sum(len(value.encode("utf-8")) for value in (url, etag, last_modified, content_hash, card_title, card_set, price) if value)
+        now = time.time()
+
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, etag, last_modified, content_hash, card_title, card_set, price, size, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_hash, card_title, card_set, price, size, now, now)
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _delete(self, url, size):
+        self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+        self._total_bytes -= size
+
+    def _evict(self):
+        # Drop least recently used entries until we are back under 90% of the budget
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT url, size FROM responses ORDER BY last_access").fetchall()
+        evicted = 0
+        for url, size in rows:
+            if self._total_bytes <= target:
+                break
+            self._delete(url, size)
+            evicted += 1
+        log(f"Response cache evicted {evicted} entries.")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Returns the process-wide response cache, or None when RESPONSE_CACHE_PATH is empty."""
+    global _cache
+    if not RESPONSE_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(RESPONSE_CACHE_PATH)
+    return _cache
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import threading
+import time
+from utils import log
+
+# Journals older than this are treated as abandoned and discarded instead of resumed
+RUN_JOURNAL_MAX_AGE_HOURS = float(os.getenv("RUN_JOURNAL_MAX_AGE_HOURS", "24"))
+
+class RunJournal:
+    """Append-only SQLite record of cards finished during an update_excel run, used to resume after a crash."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS run (started_at REAL NOT NULL)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                link TEXT PRIMARY KEY,
+                card_title TEXT,
+                card_set TEXT,
+                price REAL
+            )
+        """)
+
+        started = self._conn.execute("SELECT started_at FROM run").fetchone()
+        if started is None:
+            self._conn.execute("INSERT INTO run (started_at) VALUES (?)", (time.time(),))
+        elif time.time() - started[0] > RUN_JOURNAL_MAX_AGE_HOURS * 3600:
+            log("Discarding stale run journal.")
+            self._conn.execute("DELETE FROM results")
+            self._conn.execute("UPDATE run SET started_at = ?", (time.time(),))
+        self._conn.commit()
+
+    @classmethod
+    def for_workbook(cls, file_path):
+        """Opens (or resumes) the journal that sits next to the workbook."""
+        return cls(f"{file_path}.journal.sqlite")
+
+    def completed(self):
+        """Returns {link: (title, set, price)} for every card already finished in this run."""
+        with self._lock:
+            rows = self._conn.execute("SELECT link, card_title, card_set, price FROM results").fetchall()
+        return {link: (card_title, card_set, price) for link, card_title, card_set, price in rows}
+
+    def record(self, link, card_title, card_set, price):
+        """Durably records one finished card."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (link, card_title, card_set, price) VALUES (?, ?, ?, ?)",
+                (link, card_title, card_set, price)
+            )
+            self._conn.commit()
+
+    def finish(self):
+        """Deletes the journal once the run's results are safely saved."""
+        with self._lock:
+            self._conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
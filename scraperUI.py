@@ -1,22 +1,26 @@
 import tkinter as tk
-from tkinter import messagebox
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+from tkinter import messagebox, ttk
 import os
+import queue
 import logging
 from datetime import datetime
 from dotenv import load_dotenv  # type: ignore
-from urllib.parse import urlparse
-import time
-import random
-import re  # Added for better price extraction
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataSanitizer import canonicalize_link, parse_price
 
 # Load environment variables from .env
 load_dotenv()
 
 # Get Environment Variables
 FILE_PATH = os.getenv("FILE_PATH")
+UI_FETCH_WORKERS = int(os.getenv("UI_FETCH_WORKERS", "4"))  # Concurrent fetches for a pasted batch
+
+UI_POLL_MS = 100  # How often the Tk thread drains worker events
+COLUMNS = ["Card Title", "Set", "Ungraded Price", "Link"]
+
+# Fetches run on the worker pool; batches run one at a time so workbook writes never overlap
+_fetch_pool = ThreadPoolExecutor(max_workers=UI_FETCH_WORKERS, thread_name_prefix="ui-fetch")
+_batch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ui-batch")
 
 # Configure logging
 logging.basicConfig(filename="scraper_ui.log", level=logging.INFO, format="%(asctime)s - %(message)s")
@@ -25,143 +29,147 @@ def log(message):
     print(message)
     logging.info(message)
 
-# Validate URL function
-def is_valid_pricecharting_url(url):
-    parsed_url = urlparse(url)
-    return parsed_url.netloc.endswith("pricecharting.com") and parsed_url.scheme in ["http", "https"]
-
-# Function to scrape card details
-def get_card_details(url):
-    if not is_valid_pricecharting_url(url):
-        log("Invalid URL entered.")
-        return None, None, None
-
-    headers = {'User-Agent': 'Mozilla/5.0'}  # Helps prevent being blocked
-    retries = 3
-
-    for attempt in range(retries):
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 429:
-                time.sleep(random.uniform(5, 10))  # Avoid rate-limiting
-                continue
-            if response.status_code != 200:
-                return None, None, None
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Extract card title and set
-            title_element = soup.find("h1", id="product_name")
-            card_title = title_element.contents[0].strip() if title_element and title_element.contents else "Title not found"
-            set_element = title_element.find("a") if title_element else None
-            card_set = set_element.text.strip() if set_element else "Set not found"
-
-            # Extract price from multiple potential locations
-            price_element = soup.find("span", class_="price js-price")  # First method
-            if not price_element:
-                # Try looking inside <td id="used_price">
-                used_price_element = soup.find("td", id="used_price")
-                if used_price_element:
-                    price_element = used_price_element.find("span", class_="price js-price")
-
-            # Extract and clean the price
-            price_text = price_element.text.strip() if price_element else ""
-            price_match = re.search(r"(\d+\.\d{2})", price_text)
-            ungraded_price = float(price_match.group(1)) if price_match else None
-
-            return card_title, card_set, ungraded_price
-
-        except requests.RequestException as e:
-            log(f"Request error: {e}")
-            time.sleep(random.uniform(1, 3))
-
-    return None, None, ungraded_price
-
 # Function to sanitize Excel input
 def sanitize_excel_input(value):
     if isinstance(value, str) and value.startswith(("=", "+", "-", "@")):
         return "'" + value
     return value
 
-# Function to add data to Excel
-def add_to_excel(url):
-    card_title, card_set, ungraded_price = get_card_details(url)
+def known_links(df):
+    """Hashed index of the canonical links already in the sheet, for O(1) duplicate checks."""
+    return {canonicalize_link(str(link)) for link in df["Link"].dropna()}
 
-    # Ensure ungraded_price has a default value
-    if ungraded_price is None:
-        ungraded_price = "Price not found"
+def read_sheet():
+    """Loads the workbook (or an empty sheet) with every expected column present."""
+    import pandas as pd  # Loaded on first batch so the window opens without waiting on it
+    from inputCache import read_workbook
 
-    if not card_title or card_title == "Title not found":
-        messagebox.showerror("Error", "Failed to retrieve card details. Check the URL.")
-        return
+    if not os.path.exists(FILE_PATH):
+        return pd.DataFrame(columns=COLUMNS)
 
-    # Define column names explicitly
-    columns = ["Card Title", "Set", "Ungraded Price", "Link"]
-
-    # Load existing Excel file or create a new DataFrame
-    if os.path.exists(FILE_PATH):
-        df = pd.read_excel(FILE_PATH)
-
-        # Ensure the DataFrame has the correct columns
-        missing_cols = [col for col in columns if col not in df.columns]
-        for col in missing_cols:
+    df = read_workbook(FILE_PATH)
+    for col in COLUMNS:
+        if col not in df.columns:
             df[col] = None  # Add missing columns if necessary
+    return df
+
+def add_cards_to_excel(df, cards):
+    """Appends the fetched cards to the sheet and saves the workbook once."""
+    import pandas as pd
+    from inputCache import remember_workbook
 
-        # Ensure "Link" column exists
-        if "Link" in df.columns:
-            # Check if URL already exists
-            if url in df["Link"].astype(str).values:
-                messagebox.showwarning("Duplicate Entry", "This card has already been added.")
-                return
-        else:
-            df["Link"] = pd.Series(dtype=str)
-    else:
-        # Create an empty DataFrame with defined columns and types
-        df = pd.DataFrame(columns=columns)
-
-    # Prepare the new entry as a DataFrame
-    new_entry_df = pd.DataFrame([{
+    new_rows = pd.DataFrame([{
         "Card Title": sanitize_excel_input(card_title),
         "Set": sanitize_excel_input(card_set),
-        "Ungraded Price": ungraded_price,  # Ensuring price is always stored correctly
-        "Link": url
-    }], columns=columns)  # Ensure same column order
-
-    # Fix FutureWarning by excluding all-NA DataFrames
-    if df.empty or df.isna().all().all():
-        df = new_entry_df.copy()  # Direct assignment if empty or all-NA
-    else:
-        # Manually append new row(s) instead of using concat
-        for _, row in new_entry_df.iterrows():
-            df.loc[len(df)] = row.values  # Append row manually
-
+        "Ungraded Price": price if price is not None else "Price not found",
+        "Link": link
+    } for card_title, card_set, price, link in cards], columns=COLUMNS)
 
-    # Save updated Excel file
+    # Concatenating onto an empty or all-NA frame warns in pandas, so start from the new rows instead
+    df = new_rows if df.empty or df.isna().all().all() else pd.concat([df, new_rows], ignore_index=True)
     df.to_excel(FILE_PATH, index=False)
-
-    messagebox.showinfo("Scraping Complete", f"Card: {card_title}\nSet: {card_set}\nUngraded Price: ${ungraded_price if isinstance(ungraded_price, float) else 'N/A'}")
-    log(f"Added: {card_title}, {card_set}, ${ungraded_price if isinstance(ungraded_price, float) else 'N/A'}")
+    remember_workbook(FILE_PATH, df)
+
+def format_price(price):
+    return f"${price:.2f}" if isinstance(price, float) else "N/A"
+
+def fetch_batch(items, post):
+    """
+    Runs on the batch thread: skips links already in the workbook, fetches the rest on the worker pool and
+    writes every card found in a single save. post(event) hands status updates to the Tk thread.
+    """
+    try:
+        # The scraper's own fetcher: same host check, retries, rate limiting, response cache and link health.
+        # Loaded on first batch so the window opens without waiting on it.
+        from dataFetcher import get_card_details
+
+        df = read_sheet()
+        known = known_links(df)
+        futures = {}
+        for row_id, url in items:
+            if url in known:
+                post(("status", row_id, "Duplicate", "", ""))
+                continue
+            known.add(url)  # Also catches the same card pasted twice
+            post(("status", row_id, "Fetching", "", ""))
+            # A pasted link is fetched even if it failed recently; the user is asking for it now
+            futures[_fetch_pool.submit(get_card_details, url, bypass_negative_cache=True)] = (row_id, url)
+
+        fetched = []
+        for future in as_completed(futures):
+            row_id, url = futures[future]
+            try:
+                card_title, card_set, price_text = future.result()
+                price = parse_price(price_text)
+            except Exception as e:
+                log(f"Error fetching {url}: {e}")
+                card_title = None
+
+            if not card_title or card_title == "Title not found":
+                post(("status", row_id, "Failed", "", ""))
+                continue
+            fetched.append((row_id, (card_title, card_set, price, url)))
+            post(("status", row_id, "Saving", card_title, format_price(price)))
+
+        if fetched:
+            add_cards_to_excel(df, [card for _, card in fetched])
+            for row_id, (card_title, card_set, price, _) in fetched:
+                log(f"Added: {card_title}, {card_set}, {format_price(price)}")
+                post(("status", row_id, "Added", card_title, format_price(price)))
+        post(("done", f"Added {len(fetched)} of {len(items)} cards."))
+    except Exception as e:
+        log(f"Error adding cards: {e}")
+        post(("done", f"Error adding cards: {e}"))
 
 # UI Setup
 def create_ui():
     root = tk.Tk()
     root.title("TCG Scraper UI")
-    root.geometry("400x200")
+    root.geometry("760x480")
+
+    tk.Label(root, text="Paste PriceCharting URLs (one per line):").pack(pady=(10, 0))
+    url_text = tk.Text(root, width=90, height=6)
+    url_text.pack(padx=10)
+
+    tree = ttk.Treeview(root, columns=("link", "status", "title", "price"), show="headings")
+    for column, heading, width in (("link", "Link", 330), ("status", "Status", 80), ("title", "Card", 230), ("price", "Price", 80)):
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor=tk.W)
 
-    tk.Label(root, text="Enter PriceCharting URL:").pack(pady=10)
-    url_entry = tk.Entry(root, width=50)
-    url_entry.pack()
+    status_label = tk.Label(root, text="")
+    events = queue.Queue()  # Worker threads never touch Tk widgets; they post here instead
 
     def on_submit():
-        url = url_entry.get().strip()
-        if not url:
+        urls = [canonicalize_link(line) for line in url_text.get("1.0", tk.END).split()]
+        if not urls:
             messagebox.showerror("Error", "Please enter a valid URL.")
             return
-        add_to_excel(url)
+        url_text.delete("1.0", tk.END)
+
+        items = [(tree.insert("", tk.END, values=(url, "Queued", "", "")), url) for url in urls]
+        status_label.config(text=f"Fetching {len(items)} cards...")
+        _batch_pool.submit(fetch_batch, items, events.put)
+
+    def poll_events():
+        # Runs on the Tk thread, so widget updates are safe here
+        while True:
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "status":
+                _, row_id, status, card_title, price = event
+                tree.item(row_id, values=(tree.set(row_id, "link"), status, card_title, price))
+            else:
+                status_label.config(text=event[1])
+        root.after(UI_POLL_MS, poll_events)
 
     submit_btn = tk.Button(root, text="Scrape & Add", command=on_submit)
     submit_btn.pack(pady=10)
+    tree.pack(fill=tk.BOTH, expand=True, padx=10)
+    status_label.pack(pady=5)
 
+    root.after(UI_POLL_MS, poll_events)
     root.mainloop()
 
 if __name__ == "__main__":
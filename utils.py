@@ -1,12 +1,41 @@
+import os
+import sys
+import json
+import queue
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
 
-# Configure logging
-logging.basicConfig(filename="scraper.log", level=logging.INFO, format="%(asctime)s - %(message)s")
+# Console output style: "tty" (default), "quiet" (log file only) or "json" (one JSON object per line)
+PROGRESS_MODE = os.getenv("PROGRESS_MODE", "tty").lower()
+
+class _JsonConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({"event": "log", "message": record.getMessage()})
+
+# Configure logging: callers only enqueue records, a single listener thread does the file and console I/O
+_log_queue = queue.SimpleQueue()
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))  # Listener handlers apply the real formats
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+
+_file_handler = logging.FileHandler("scraper.log")
+_file_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.addFilter(logging.Filter("pkcscraper"))  # Library logs go to the file only
+_console_handler.setFormatter(_JsonConsoleFormatter() if PROGRESS_MODE == "json" else logging.Formatter("%(message)s"))
+
+_handlers = [_file_handler] if PROGRESS_MODE == "quiet" else [_file_handler, _console_handler]
+_listener = QueueListener(_log_queue, *_handlers)
+_listener.start()
+atexit.register(_listener.stop)  # Drains queued records before exit
+
+_logger = logging.getLogger("pkcscraper")
 
 def log(message):
     """Logs messages with timestamps and prints to console."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     message_with_timestamp = f"[{timestamp}] {message}"
-    print(message_with_timestamp)
-    logging.info(message_with_timestamp)
+    _logger.info(message_with_timestamp)
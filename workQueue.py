@@ -0,0 +1,248 @@
+import os
+import time
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from dbManager import get_db_engine, ensure_db_initialized
+from utils import log
+import metrics
+
+# Distributed mode: the coordinator (update_excel with FETCH_MODE=distributed) enqueues links in
+# card_inventory.fetch_jobs and any number of workers (python workQueue.py) claim leased batches
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "50"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))  # A batch not heartbeated for this long is re-queued
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # Leases per link before it is given up as failed
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+WORKER_FETCH_THREADS = int(os.getenv("WORKER_FETCH_THREADS", "10"))
+
+def enqueue_run(run_id, links):
+    """
+    Queues links for run_id. Results a crashed coordinator never collected are kept for pickup;
+    links whose result was already collected by an earlier run are queued again.
+    """
+    query = text("""
+        INSERT INTO card_inventory.fetch_jobs (run_id, link)
+        SELECT :run_id, link FROM unnest(CAST(:links AS TEXT[])) AS link
+        ON CONFLICT (run_id, link) DO UPDATE
+        SET status = 'queued', attempts = 0, worker_id = NULL, lease_expires_at = NULL,
+            card_title = NULL, card_set = NULL, price = NULL, collected = FALSE, updated_at = NOW()
+        WHERE card_inventory.fetch_jobs.collected;
+    """)
+    with get_db_engine().begin() as conn:
+        conn.execute(query, {"run_id": run_id, "links": list(links)})
+
+def claim_batch(worker_id, run_id=None, batch_size=None):
+    """
+    Leases up to batch_size queued (or lease-expired) links to worker_id and returns [(run_id, link)].
+    SKIP LOCKED lets every worker claim at once without blocking on, or double-claiming, each other's rows.
+    """
+    query = text("""
+        WITH claimed AS (
+            SELECT run_id, link
+            FROM card_inventory.fetch_jobs
+            WHERE (CAST(:run_id AS TEXT) IS NULL OR run_id = :run_id)
+              AND attempts < :max_attempts
+              AND (status = 'queued' OR (status = 'leased' AND lease_expires_at < NOW()))
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE card_inventory.fetch_jobs j
+        SET status = 'leased', worker_id = :worker_id, attempts = j.attempts + 1,
+            lease_expires_at = NOW() + :lease * INTERVAL '1 second', updated_at = NOW()
+        FROM claimed
+        WHERE j.run_id = claimed.run_id AND j.link = claimed.link
+        RETURNING j.run_id, j.link;
+    """)
+    with get_db_engine().begin() as conn:
+        return conn.execute(query, {
+            "run_id": run_id,
+            "worker_id": worker_id,
+            "batch_size": batch_size or JOB_BATCH_SIZE,
+            "max_attempts": JOB_MAX_ATTEMPTS,
+            "lease": JOB_LEASE_SECONDS,
+        }).fetchall()
+
+def heartbeat(worker_id, jobs):
+    """Extends the lease on jobs this worker still holds."""
+    query = text("""
+        UPDATE card_inventory.fetch_jobs
+        SET lease_expires_at = NOW() + :lease * INTERVAL '1 second'
+        WHERE run_id = :run_id AND link = :link AND worker_id = :worker_id AND status = 'leased';
+    """)
+    with get_db_engine().begin() as conn:
+        conn.execute(query, [
+            {"run_id": run_id, "link": link, "worker_id": worker_id, "lease": JOB_LEASE_SECONDS}
+            for run_id, link in jobs
+        ])
+
+def complete_jobs(worker_id, results):
+    """
+    Marks jobs done with their (run_id, link, title, set, price) results. A worker whose lease expired
+    and was re-claimed no longer owns the row, so its late result is dropped here.
+    """
+    query = text("""
+        UPDATE card_inventory.fetch_jobs
+        SET status = 'done', card_title = :card_title, card_set = :card_set, price = :price, updated_at = NOW()
+        WHERE run_id = :run_id AND link = :link AND worker_id = :worker_id AND status = 'leased';
+    """)
+    with get_db_engine().begin() as conn:
+        conn.execute(query, [
+            {"run_id": run_id, "link": link, "worker_id": worker_id,
+             "card_title": card_title, "card_set": card_set, "price": price}
+            for run_id, link, card_title, card_set, price in results
+        ])
+
+def fail_exhausted_jobs(run_id):
+    """Gives up on links whose last allowed lease expired, e.g. pages that keep killing workers."""
+    query = text("""
+        UPDATE card_inventory.fetch_jobs
+        SET status = 'failed', updated_at = NOW()
+        WHERE run_id = :run_id AND attempts >= :max_attempts
+          AND (status = 'queued' OR (status = 'leased' AND lease_expires_at < NOW()));
+    """)
+    with get_db_engine().begin() as conn:
+        return conn.execute(query, {"run_id": run_id, "max_attempts": JOB_MAX_ATTEMPTS}).rowcount
+
+def collect_results(run_id):
+    """Returns [(link, title, set, price)] for finished jobs not collected yet, marking them collected."""
+    query = text("""
+        UPDATE card_inventory.fetch_jobs
+        SET collected = TRUE
+        WHERE run_id = :run_id AND status IN ('done', 'failed') AND NOT collected
+        RETURNING link, card_title, card_set, price;
+    """)
+    with get_db_engine().begin() as conn:
+        return conn.execute(query, {"run_id": run_id}).fetchall()
+
+def run_status(run_id):
+    """Returns {status: count} for a run."""
+    query = text("""
+        SELECT status, COUNT(*) FROM card_inventory.fetch_jobs WHERE run_id = :run_id GROUP BY status;
+    """)
+    with get_db_engine().connect() as conn:
+        return dict(conn.execute(query, {"run_id": run_id}).fetchall())
+
+def delete_run(run_id):
+    """Removes a finished run's jobs."""
+    with get_db_engine().begin() as conn:
+        conn.execute(text("DELETE FROM card_inventory.fetch_jobs WHERE run_id = :run_id;"), {"run_id": run_id})
+
+def fetch_distributed(run_id, links, on_result, indices=None):
+    """
+    Coordinator side: enqueues links and calls on_result with (index, title, set, price) tuples as workers
+    finish them, in the calling thread. Returns once every link has a result; workers have already
+    written each card through the normal upsert path.
+    """
+    indices = list(indices) if indices is not None else list(range(len(links)))
+    index_by_link = dict(zip(links, indices))
+    enqueue_run(run_id, links)
+    log(f"Queued {len(links)} cards for distributed run {run_id}; waiting for workers.")
+
+    remaining = set(links)
+    last_progress = time.time()
+    while remaining:
+        if fail_exhausted_jobs(run_id):
+            log("Some cards failed on every attempt and were given up.")
+
+        rows = collect_results(run_id)
+        for link, card_title, card_set, price in rows:
+            if link not in remaining:
+                continue
+            remaining.discard(link)
+            on_result((index_by_link[link], card_title or "Title not found", card_set or "Set not found",
+                       float(price) if price is not None else None))
+
+        if rows:
+            last_progress = time.time()
+        elif time.time() - last_progress > JOB_LEASE_SECONDS:
+            log(f"No distributed progress for {JOB_LEASE_SECONDS}s ({run_status(run_id)}); are any workers running?")
+            last_progress = time.time()
+        if remaining:
+            time.sleep(JOB_POLL_SECONDS)
+
+    delete_run(run_id)
+
+class _LeaseHeartbeat:
+    """Background thread that keeps a claimed batch's lease alive while it is being fetched."""
+
+    def __init__(self, worker_id, jobs):
+        self.worker_id = worker_id
+        self.jobs = jobs
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                heartbeat(self.worker_id, self.jobs)
+            except Exception as e:
+                log(f"Heartbeat failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+def run_worker(run_id=None, worker_id=None, exit_when_idle=False):
+    """
+    Worker side: claims batches, fetches them, writes each card through the batched upsert and marks the
+    jobs done. Serves every run unless run_id is given; exits when the queue is empty if exit_when_idle.
+    """
+    from dataFetcher import fetch_card_data
+    from dataStorage import BatchedCardWriter
+    from dataSanitizer import canonicalize_link
+    from linkHealth import SKIPPED_LINK
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    ensure_db_initialized()
+    log(f"Worker {worker_id} started.")
+
+    with BatchedCardWriter() as writer, ThreadPoolExecutor(max_workers=WORKER_FETCH_THREADS) as executor:
+        while True:
+            jobs = claim_batch(worker_id, run_id)
+            if not jobs:
+                if exit_when_idle:
+                    break
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+
+            def fetch(job):
+                try:
+                    return fetch_card_data(job[1], None)
+                except Exception as e:
+                    log(f"Error fetching card data: {e}")
+                    return None, "Title not found", "Set not found", None
+
+            with _LeaseHeartbeat(worker_id, jobs):
+                fetched = list(executor.map(fetch, jobs))
+
+            results = []
+            for (job_run_id, link), (_, card_title, card_set, price) in zip(jobs, fetched):
+                if card_title != SKIPPED_LINK:  # The coordinator leaves skipped cards' rows as they are
+                    writer.submit(card_title, card_set, price, link)
+                results.append((job_run_id, link, card_title, card_set, price))
+
+            # Cards reach the database before their jobs are reported done. Jobs whose rows the writer couldn't
+            # save stay leased, so the lease expires and another attempt re-queues them through the upsert.
+            unsaved = {row["link"] for row in writer.flush()}
+            if unsaved:
+                results = [result for result in results if canonicalize_link(result[1]) not in unsaved]
+                log(f"Worker {worker_id} couldn't save {len(unsaved)} cards; leaving their jobs to expire and retry.")
+            complete_jobs(worker_id, results)
+            metrics.inc("jobs_completed", len(results))
+            log(f"Worker {worker_id} finished {len(results)} cards.")
+
+    log(f"Worker {worker_id} stopped: queue empty.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed scrape worker: claims card batches from the Postgres job queue.")
+    parser.add_argument("--run-id", help="Only serve this run (default: any run)")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Stop once no jobs are left instead of polling")
+    args = parser.parse_args()
+    run_worker(args.run_id, exit_when_idle=args.exit_when_idle)